@@ -0,0 +1,49 @@
+"""Throughput of creating bonus requests one by one vs. in one bulk INSERT ... SELECT FROM unnest(...).
+
+    python -m benchmarks.bench_bulk_create [rows]
+"""
+import sys
+
+from benchmarks.common import bench_database, fill_reference_data, measure, print_table
+from lambda_requests.orm_services import RequestQuery
+
+
+def build_items(rows):
+    return [{
+        'creator': 1 + n % 100,
+        'reviewer': 1 + (n + 1) % 100,
+        'bonus_type': 1 + n % 10,
+        'payment_amount': 100 + n % 900,
+        'payment_date': '2022-12-31',
+        'description': f'Quarter-end bonus {n}'
+    } for n in range(rows)]
+
+
+def create_one_by_one(items):
+    for item in items:
+        RequestQuery.add_new_request({**item, 'status': 'created'})
+
+
+def create_in_bulk(items):
+    result = RequestQuery.add_new_requests(items)
+    assert len(result['created']) == len(items), result['errors'][:5]
+
+
+def main(rows=10000):
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            fill_reference_data(connection)
+
+        items = build_items(rows)
+        results = []
+
+        for name, func in (('one by one', create_one_by_one), ('bulk', create_in_bulk)):
+            elapsed_ms = measure(lambda: func(items))[0]
+            results.append({'path': name, 'rows': rows, 'total_ms': elapsed_ms,
+                            'rows_per_second': rows / elapsed_ms * 1000})
+
+        print_table(f'Creating {rows} requests', results)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
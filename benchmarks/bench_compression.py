@@ -0,0 +1,51 @@
+"""CPU cost of compressing list responses vs. the bytes it saves, base64 included.
+
+Needs no database, the payloads are built in memory.
+
+    python -m benchmarks.bench_compression
+"""
+import base64
+import gzip
+
+from benchmarks.bench_json_encoders import build_requests
+from benchmarks.common import measure, summarize, print_table
+from utils.http import encode_json, brotli
+
+PAYLOADS = (100, 1000, 10000)
+
+
+def build_workers(rows):
+    return [{'id': n, 'full_name': f'Worker {n}', 'position': 'developer', 'slack_id': f'S{n:010d}',
+             'roles': ['worker', 'reviewer'] if n % 10 == 0 else ['worker']} for n in range(1, rows + 1)]
+
+
+def build_compressors():
+    compressors = [(f'gzip {level}', lambda body, level=level: gzip.compress(body, compresslevel=level, mtime=0))
+                   for level in (1, 6, 9)]
+
+    if brotli is not None:
+        compressors += [(f'br {quality}', lambda body, quality=quality: brotli.compress(body, quality=quality))
+                        for quality in (1, 5, 11)]
+
+    return compressors
+
+
+def main():
+    rows = []
+
+    for endpoint, build in (('GET /requests', build_requests), ('GET /workers', build_workers)):
+        for size in PAYLOADS:
+            body = encode_json(build(size)).encode()
+
+            for name, compress in build_compressors():
+                timings = summarize(measure(lambda: base64.b64encode(compress(body)), 10))
+                sent = len(base64.b64encode(compress(body)))
+                rows.append({'endpoint': endpoint, 'rows': size, 'encoding': name, 'raw_kb': len(body) / 1024,
+                             'sent_kb': sent / 1024, 'saved': f'{1 - sent / len(body):.0%}',
+                             'p50_ms': timings['p50_ms']})
+
+    print_table('Compression of list responses', rows)
+
+
+if __name__ == '__main__':
+    main()
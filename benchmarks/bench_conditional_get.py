@@ -0,0 +1,33 @@
+"""GET /requests and GET /workers polled without a validator vs. with a matching If-None-Match (304).
+
+    python -m benchmarks.bench_conditional_get [requests] [workers]
+"""
+import sys
+
+from benchmarks.common import bench_database, fill_reference_data, fill_requests, measure, summarize, print_table
+from lambda_requests.lambda_function import lambda_handler as requests_handler
+from lambda_workers.lambda_function import lambda_handler as workers_handler
+
+
+def main(requests=100000, workers=10000):
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            fill_reference_data(connection, workers=workers)
+            fill_requests(connection, requests, workers=workers)
+
+        rows = []
+        for endpoint, handler in (('/requests', requests_handler), ('/workers', workers_handler)):
+            event = {'resource': endpoint, 'httpMethod': 'GET', 'queryStringParameters': None, 'headers': {}}
+            etag = handler(event, None)['headers']['ETag']
+            polled = {**event, 'headers': {'If-None-Match': etag}}
+
+            for name, poll_event in (('full body', event), ('304', polled)):
+                timings = summarize(measure(lambda: handler(poll_event, None), 5))
+                rows.append({'endpoint': f'GET {endpoint}', 'response': name, 'p50_ms': timings['p50_ms'],
+                             'p95_ms': timings['p95_ms']})
+
+        print_table(f'Conditional GET, {requests} requests, {workers} workers', rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,58 @@
+"""Response serialization: the old str() + json.dumps path vs. the encoders in utils.http.
+
+Needs no database, the payloads are built in memory.
+
+    python -m benchmarks.bench_json_encoders [rows]
+"""
+import json
+import sys
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import measure, summarize, print_table
+from utils.http import JSON_ENCODERS
+
+
+def build_requests(rows):
+    created_at = datetime(2022, 9, 1, 10, 30, 15, 123456)
+
+    return [{
+        'id': n,
+        'creator': 1 + n % 100,
+        'reviewer': 1 + (n + 1) % 100,
+        'bonus_type': 1 + n % 10,
+        'payment_amount': 100 + n % 900,
+        'payment_date': date(2022, 1, 1) + timedelta(days=n % 365),
+        'status': 'created',
+        'description': f'Synthetic request {n}',
+        'created_at': created_at + timedelta(minutes=n),
+        'bonus_name': f'Bonus {1 + n % 10}',
+        'creator_name': f'Worker {1 + n % 100}',
+        'creator_slack_id': f'S{1 + n % 100:010d}',
+        'reviewer_name': f'Worker {1 + (n + 1) % 100}',
+        'reviewer_slack_id': f'S{1 + (n + 1) % 100:010d}'
+    } for n in range(1, rows + 1)]
+
+
+def str_and_dumps(requests):
+    # The pre-encoder path: Request.to_dict turned dates into strings, then stdlib json.dumps
+    return json.dumps([{**request, 'payment_date': str(request['payment_date']),
+                        'created_at': str(request['created_at'])} for request in requests])
+
+
+def main(rows=10000):
+    requests = build_requests(rows)
+
+    cases = [('str() + json.dumps', str_and_dumps)]
+    cases += [(f'encoder {name}', encoder) for name, encoder in JSON_ENCODERS.items()]
+
+    rows_out = []
+    for name, func in cases:
+        timings = summarize(measure(lambda: func(requests), 20))
+        rows_out.append({'path': name, 'p50_ms': timings['p50_ms'], 'p95_ms': timings['p95_ms'],
+                         'body_kb': len(func(requests).encode()) // 1024})
+
+    print_table(f'Serialize {rows} requests', rows_out)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,35 @@
+"""GET /requests and GET /workers serialized by json.dumps over ORM rows vs. built by Postgres with row_to_json.
+
+    python -m benchmarks.bench_json_listing [requests] [workers]
+"""
+import sys
+
+from benchmarks.common import bench_database, fill_reference_data, fill_requests, measure, summarize, print_table
+from lambda_requests.orm_services import RequestQuery
+from lambda_workers.orm_services import WorkersQuery
+from utils.http import http_ok, http_ok_encoded
+
+
+def main(requests=100000, workers=10000):
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            fill_reference_data(connection, workers=workers)
+            fill_requests(connection, requests, workers=workers)
+
+        cases = (
+            ('GET /requests', 'orm + json.dumps', lambda: http_ok(RequestQuery.get_requests())),
+            ('GET /requests', 'row_to_json', lambda: http_ok_encoded(RequestQuery.get_requests_json())),
+            ('GET /workers', 'orm + json.dumps', lambda: http_ok(WorkersQuery.get_workers())),
+            ('GET /workers', 'row_to_json', lambda: http_ok_encoded(WorkersQuery.get_workers_json()))
+        )
+
+        rows = []
+        for endpoint, name, func in cases:
+            timings = summarize(measure(func, 5))
+            rows.append({'endpoint': endpoint, 'path': name, 'p50_ms': timings['p50_ms'], 'p95_ms': timings['p95_ms']})
+
+        print_table(f'List endpoints, {requests} requests, {workers} workers', rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
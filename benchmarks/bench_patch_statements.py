@@ -0,0 +1,62 @@
+"""Statements and latency per PATCH: ORM load + setattr + commit vs. one UPDATE ... RETURNING.
+
+    python -m benchmarks.bench_patch_statements [runs]
+"""
+import os
+import sys
+
+from benchmarks.common import bench_database, fill_reference_data, fill_requests, measure, summarize, print_table
+from lambda_bonuses.orm_services import BonusesQuery
+from lambda_requests.orm_services import RequestQuery
+from models.models import Bonus, Request
+from utils.database import open_db_session
+from utils.instrumentation import INVOCATION_STATS, reset_invocation_stats
+
+
+def orm_update(model, object_id, data):
+    # The pre-UPDATE ... RETURNING implementation, kept here as the baseline
+    with open_db_session() as session:
+        object_to_update = session.query(model).filter(model.id == object_id).first()
+
+        for key, value in data.items():
+            object_to_update.__setattr__(key, value)
+
+        session.commit()
+        session.flush()
+
+        return object_to_update.to_dict()
+
+
+def bench(name, func, runs):
+    reset_invocation_stats()
+    func()
+    statements = INVOCATION_STATS['queries']
+
+    timings = summarize(measure(func, runs))
+
+    return {'path': name, 'statements': statements, 'p50_ms': timings['p50_ms'], 'p95_ms': timings['p95_ms']}
+
+
+def main(runs=500):
+    os.environ['DB_INSTRUMENTATION'] = 'true'
+
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            fill_reference_data(connection)
+            fill_requests(connection, 10000)
+
+        request_data = {'payment_amount': 500, 'description': 'Updated'}
+        bonus_data = {'description': 'Updated'}
+
+        rows = [
+            bench('requests: orm', lambda: orm_update(Request, 5000, request_data), runs),
+            bench('requests: update returning', lambda: RequestQuery.update_request(5000, dict(request_data)), runs),
+            bench('bonuses: orm', lambda: orm_update(Bonus, 5, bonus_data), runs),
+            bench('bonuses: update returning', lambda: BonusesQuery.update_bonus(5, dict(bonus_data)), runs),
+        ]
+
+        print_table(f'PATCH, {runs} runs each (statements counted by cursor events)', rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,55 @@
+"""Cold vs warm connection latency for every pool profile in utils.database.
+
+Run against a local Postgres configured through the usual POSTGRES_* variables:
+
+    python -m benchmarks.bench_pool_profiles [warm_runs]
+"""
+import os
+import sys
+
+from benchmarks.common import measure, summarize, print_table
+from utils.database import POOL_PROFILES, dispose_db_engines, open_db_session, get_pool_stats
+
+
+def run_query():
+    with open_db_session() as session:
+        session.execute('SELECT 1')
+
+
+def bench_profile(profile_name, warm_runs):
+    os.environ['DB_POOL_PROFILE'] = profile_name
+    dispose_db_engines()
+
+    cold = measure(run_query)
+    warm = summarize(measure(run_query, warm_runs))
+    stats = get_pool_stats()
+
+    dispose_db_engines()
+
+    return {
+        'profile': profile_name,
+        'cold_ms': cold[0],
+        'warm_mean_ms': warm['mean_ms'],
+        'warm_p95_ms': warm['p95_ms'],
+        'connects': stats['connects'],
+        'checkouts': stats['checkouts']
+    }
+
+
+def main(warm_runs=200):
+    rows = []
+
+    for profile_name in POOL_PROFILES:
+        connects_before = get_pool_stats()['connects']
+        checkouts_before = get_pool_stats()['checkouts']
+
+        row = bench_profile(profile_name, warm_runs)
+        row['connects'] -= connects_before
+        row['checkouts'] -= checkouts_before
+        rows.append(row)
+
+    print_table(f'Pool profiles, 1 cold + {warm_runs} warm invocations', rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
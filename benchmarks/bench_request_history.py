@@ -0,0 +1,57 @@
+"""History pages of a single request with a large number of entries.
+
+Compares loading the whole history with walking it in keyset pages and with a one-day time range:
+
+    python -m benchmarks.bench_request_history [entries] [page_size]
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+
+from benchmarks.common import bench_database, fill_reference_data, fill_requests, measure, summarize, print_table
+from lambda_requests.orm_services import RequestHistoryQuery
+
+
+def fill_history(connection, entries, request_id=1):
+    connection.execute(text(f"""
+        INSERT INTO requests_history (request_id, changes, editor, timestamp)
+        SELECT {request_id}, 'status: created -> approved', 'U' || n % 100, now() - (n || ' seconds')::interval
+        FROM generate_series(1, {entries}) n;
+        ANALYZE;
+    """))
+
+
+def walk_pages(page_size, pages):
+    cursor = None
+
+    for _ in range(pages):
+        page = RequestHistoryQuery.get_history_page(1, page_size, cursor)
+        cursor = page['next_cursor']
+
+
+def main(entries=100000, page_size=100):
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            fill_reference_data(connection)
+            fill_requests(connection, 1000)
+            fill_history(connection, entries)
+
+        day_ago = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+
+        cases = {
+            'full history': lambda: RequestHistoryQuery.get_history(1),
+            'first page': lambda: RequestHistoryQuery.get_history_page(1, page_size),
+            '10 pages': lambda: walk_pages(page_size, 10),
+            'last day, first page': lambda: RequestHistoryQuery.get_history_page(1, page_size, since=day_ago)
+        }
+
+        results = []
+        for name, case in cases.items():
+            timings = summarize(measure(case, 10))
+            results.append({'case': name, 'p50_ms': timings['p50_ms'], 'p95_ms': timings['p95_ms']})
+
+        print_table(f'GET /requests/{{id}}/history over {entries} entries of one request', results)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
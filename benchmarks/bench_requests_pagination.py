@@ -0,0 +1,46 @@
+"""Keyset pagination of GET /requests on a large synthetic table.
+
+Fetches pages at increasing depths with the cursor and with the equivalent OFFSET to show that
+keyset pages cost the same at any depth:
+
+    python -m benchmarks.bench_requests_pagination [rows] [page_size]
+"""
+import sys
+
+from benchmarks.common import bench_database, fill_reference_data, fill_requests, measure, summarize, print_table
+from lambda_requests.orm_services import RequestQuery
+from models.models import Request
+from utils.database import open_db_session
+from utils.pagination import encode_cursor
+
+
+def fetch_with_offset(offset, page_size):
+    with open_db_session(read_only=True) as session:
+        session.query(Request).filter(Request.status != 'deleted').order_by(Request.id) \
+            .offset(offset).limit(page_size).all()
+
+
+def main(rows=1000000, page_size=100):
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            fill_reference_data(connection)
+            fill_requests(connection, rows)
+
+        results = []
+        for depth in (0, rows // 100, rows // 10, rows // 2, rows - rows // 10):
+            cursor = encode_cursor({'id': depth}) if depth else None
+            keyset = summarize(measure(lambda: RequestQuery.get_requests_page(page_size, cursor), 20))
+            offset = summarize(measure(lambda: fetch_with_offset(depth, page_size), 5))
+
+            results.append({
+                'after_id': depth,
+                'keyset_p50_ms': keyset['p50_ms'],
+                'keyset_p95_ms': keyset['p95_ms'],
+                'offset_p50_ms': offset['p50_ms']
+            })
+
+        print_table(f'GET /requests pages of {page_size} over {rows} rows', results)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,61 @@
+"""GET /workers with roles regrouped in Python vs. aggregated by Postgres with array_agg.
+
+    python -m benchmarks.bench_workers_roles [workers] [roles_per_worker]
+"""
+import sys
+from sqlalchemy import text
+
+from benchmarks.common import bench_database, measure, summarize, print_table
+from lambda_workers.orm_services import WorkersQuery
+from models.models import Worker, WorkersRolesRelation, Role
+from utils.database import open_db_session
+
+
+def fill_workers(connection, workers, roles_per_worker):
+    connection.execute(text(f"""
+        INSERT INTO roles (role_name) SELECT 'role ' || n FROM generate_series(1, {roles_per_worker}) n;
+        INSERT INTO workers (full_name, position, slack_id)
+            SELECT 'Worker ' || n, 'developer', 'S' || lpad(n::text, 10, '0') FROM generate_series(1, {workers}) n;
+        INSERT INTO workers_roles_relations (worker_id, role_id) SELECT workers.id, roles.id FROM workers, roles;
+        ANALYZE;
+    """))
+
+
+def python_regrouping():
+    # The pre-array_agg implementation, kept here as the baseline: one Worker entity per worker-role pair
+    with open_db_session(read_only=True) as session:
+        query_result = session.query(Worker, WorkersRolesRelation.role_id, Role.role_name) \
+            .join(WorkersRolesRelation, Worker.id == WorkersRolesRelation.worker_id) \
+            .join(Role, WorkersRolesRelation.role_id == Role.id).all()
+
+    parsed_result = {}
+    for item in query_result:
+        if item['Worker'].id not in parsed_result:
+            parsed_result[item['Worker'].id] = {
+                'id': item['Worker'].id,
+                'full_name': item['Worker'].full_name,
+                'position': item['Worker'].position,
+                'slack_id': item['Worker'].slack_id,
+                'roles': [item['role_name']]
+            }
+        else:
+            parsed_result[item['Worker'].id]['roles'].append(item['role_name'])
+
+    return list(parsed_result.values())
+
+
+def main(workers=50000, roles_per_worker=5):
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            fill_workers(connection, workers, roles_per_worker)
+
+        rows = []
+        for name, func in (('python regrouping', python_regrouping), ('array_agg', WorkersQuery.get_workers)):
+            timings = summarize(measure(func, 5))
+            rows.append({'path': name, 'p50_ms': timings['p50_ms'], 'p95_ms': timings['p95_ms']})
+
+        print_table(f'GET /workers, {workers} workers x {roles_per_worker} roles', rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,62 @@
+"""Slack directory sync: POST /workers/sync vs. one add_new_worker/update_worker call per person.
+
+The per-person path is timed on a sample and extrapolated to the full directory:
+
+    python -m benchmarks.bench_workers_sync [people] [sample]
+"""
+import sys
+from sqlalchemy import text
+
+from benchmarks.common import bench_database, measure, print_table
+from lambda_workers.orm_services import WorkersQuery
+
+
+def build_directory(people, changed_every=0):
+    directory = []
+
+    for n in range(1, people + 1):
+        changed = changed_every and n % changed_every == 0
+        directory.append({
+            'full_name': f'Worker {n}',
+            'position': 'team lead' if changed else 'developer',
+            'slack_id': f'S{n:010d}',
+            'roles': [1, 2] if changed else [1]
+        })
+
+    return directory
+
+
+def per_person_sync(directory):
+    for person in directory:
+        worker = WorkersQuery.get_worker_by_slack_id(person['slack_id'], read_your_writes=True)
+
+        if worker:
+            WorkersQuery.update_worker(worker['id'], {'position': person['position'], 'roles': person['roles']})
+        else:
+            WorkersQuery.add_new_worker(dict(person))
+
+
+def main(people=20000, sample=1000):
+    with bench_database() as engine:
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO roles (role_name) VALUES ('worker'), ('reviewer'), ('administrator')"))
+
+        rows = []
+        for name, directory in (('initial import', build_directory(people)),
+                                ('10% changed', build_directory(people, changed_every=10))):
+            sync_ms = measure(lambda: WorkersQuery.sync_workers(directory))[0]
+            rows.append({'sync': name, 'bulk_s': sync_ms / 1000})
+
+        with engine.begin() as connection:
+            connection.execute(text('TRUNCATE workers, workers_roles_relations RESTART IDENTITY CASCADE'))
+
+        sample_ms = measure(lambda: per_person_sync(build_directory(sample)))[0]
+        rows[0]['per_person_s'] = sample_ms / 1000 * people / sample
+        sample_ms = measure(lambda: per_person_sync(build_directory(sample, changed_every=10)))[0]
+        rows[1]['per_person_s'] = sample_ms / 1000 * people / sample
+
+        print_table(f'Directory sync of {people} people (per-person path extrapolated from {sample})', rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,105 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, text
+from sqlalchemy_utils import database_exists, create_database, drop_database
+
+from models.models import Base
+from utils.database import build_db_url, dispose_db_engines
+
+
+@contextmanager
+def bench_database(keep=False):
+    # Benchmarks run in their own <POSTGRES_DB>_bench database so they never touch real data
+    original_db = os.environ.get('POSTGRES_DB')
+    os.environ['POSTGRES_DB'] = f'{original_db}_bench'
+    db_url = build_db_url()
+
+    if database_exists(db_url):
+        drop_database(db_url)
+    create_database(db_url)
+
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        dispose_db_engines()
+        if not keep:
+            drop_database(db_url)
+        os.environ['POSTGRES_DB'] = original_db
+
+
+def fill_reference_data(connection, workers=100, bonuses=10):
+    connection.execute(text(f"""
+        INSERT INTO roles (role_name) VALUES ('worker'), ('reviewer'), ('administrator');
+        INSERT INTO workers (full_name, position, slack_id)
+            SELECT 'Worker ' || n, 'developer', 'S' || lpad(n::text, 10, '0') FROM generate_series(1, {workers}) n;
+        INSERT INTO workers_roles_relations (worker_id, role_id) SELECT id, 1 FROM workers;
+        INSERT INTO bonuses_types (type, description)
+            SELECT 'Bonus ' || n, 'Bonus number ' || n FROM generate_series(1, {bonuses}) n;
+    """))
+
+
+def fill_requests(connection, rows, workers=100, bonuses=10):
+    connection.execute(text(f"""
+        INSERT INTO requests (status, created_at, payment_date, payment_amount, description, creator, reviewer,
+                              bonus_type)
+        SELECT (ARRAY['created', 'approved', 'rejected', 'deleted'])[1 + n % 4],
+               now() - (n || ' minutes')::interval,
+               DATE '2022-01-01' + (n % 365),
+               100 + n % 900,
+               'Synthetic request ' || n,
+               1 + n % {workers},
+               1 + (n + 1) % {workers},
+               1 + n % {bonuses}
+        FROM generate_series(1, {rows}) n;
+        ANALYZE;
+    """))
+
+
+def measure(func, repeat=1):
+    timings = []
+
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+
+    return {
+        'runs': len(ordered),
+        'mean_ms': statistics.mean(ordered),
+        'p50_ms': ordered[len(ordered) // 2],
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max_ms': ordered[-1]
+    }
+
+
+def print_table(title, rows):
+    print(f'\n{title}')
+
+    if not rows:
+        return
+
+    columns = list(rows[0].keys())
+    widths = {column: max(len(column), *(len(_format(row[column])) for row in rows)) for column in columns}
+
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print('  '.join(_format(row[column]).ljust(widths[column]) for column in columns))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f'{value:.3f}'
+
+    return str(value)
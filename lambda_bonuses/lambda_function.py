@@ -1,9 +1,19 @@
 from .orm_services import BonusesQuery
 from utils.http import *
+from utils.database import with_db_session_scope
+from utils.instrumentation import log_invocation
 
 
-def get_bonuses():
-    bonuses = BonusesQuery.get_bonuses()
+def get_bonuses(event):
+    query_params = event.get('queryStringParameters') or {}
+
+    try:
+        bonus_ids = parse_id_list(query_params['ids']) if 'ids' in query_params else None
+        fields = parse_fields(query_params['fields'], BonusesQuery.FIELDS) if 'fields' in query_params else None
+    except ValueError:
+        return HTTP_BAD_REQUEST
+
+    bonuses = BonusesQuery.get_bonuses(bonus_ids=bonus_ids, fields=fields)
 
     if type(bonuses) is list:
         return http_ok(bonuses)
@@ -38,6 +48,8 @@ def update_bonus(id, event):
 
     if updated_bonus:
         return http_ok(updated_bonus)
+    if updated_bonus is None:
+        return HTTP_NOT_FOUND
 
     return HTTP_BAD_REQUEST
 
@@ -51,10 +63,14 @@ def delete_bonus(id):
     return HTTP_BAD_REQUEST
 
 
+@log_invocation
+@with_compression
+@with_conditional_get
+@with_db_session_scope
 def lambda_handler(event, context):
     if event['resource'] == '/bonuses':
         if event['httpMethod'] == 'GET':
-            http_response = get_bonuses()
+            http_response = get_bonuses(event)
 
         elif event['httpMethod'] == 'POST':
             http_response = create_bonus(event)
@@ -1,31 +1,61 @@
+import os
+from sqlalchemy import update
 from sqlalchemy.exc import SQLAlchemyError
 
 from models.models import Bonus
+from utils.cache import VersionedCache
 from utils.database import open_db_session
+from utils.versions import get_versions, bump_version
+
+# The whole catalog is kept per container; BONUS_CATALOG_FRESHNESS seconds pass before its version is checked
+BONUS_CATALOG = VersionedCache('bonus_catalog', freshness=float(os.environ.get('BONUS_CATALOG_FRESHNESS') or 5))
 
 
 class BonusesQuery:
+    UPDATABLE_COLUMNS = ('type', 'description')
+    FIELDS = ('id', 'type', 'description')
+
     @staticmethod
-    def get_bonuses(bonus_id=None):
-        with open_db_session() as session:
+    def get_bonuses(bonus_id=None, bonus_ids=None, fields=None, read_your_writes=False):
+        with open_db_session(read_only=not read_your_writes) as session:
             try:
-                query = session.query(Bonus).order_by(Bonus.id)
-
-                if bonus_id is not None:
-                    query = query.filter(Bonus.id == bonus_id)
-
-                query_result = query.all()
-                query_result = [bonus.to_dict() for bonus in query_result]
+                if read_your_writes:
+                    bonuses = BonusesQuery._load_catalog(session)
+                else:
+                    bonuses = BONUS_CATALOG.get(lambda: BonusesQuery._get_catalog_version(session),
+                                                lambda: BonusesQuery._load_catalog(session))
 
             except SQLAlchemyError as error:
                 print(error)
                 return 0
 
-        return query_result
+        if bonus_id is not None:
+            bonuses = [bonus for bonus in bonuses if str(bonus['id']) == str(bonus_id)]
+        if bonus_ids is not None:
+            bonus_ids = set(bonus_ids)
+            bonuses = [bonus for bonus in bonuses if bonus['id'] in bonus_ids]
+        if fields is not None:
+            bonuses = [{field: bonus[field] for field in fields} for bonus in bonuses]
+
+        return list(bonuses)
 
     @staticmethod
-    def get_bonus_by_id(bonus_id):
-        query_result = BonusesQuery.get_bonuses(bonus_id=bonus_id)
+    def _load_catalog(session):
+        query_result = session.query(Bonus).order_by(Bonus.id).all()
+
+        return [bonus.to_dict() for bonus in query_result]
+
+    @staticmethod
+    def _get_catalog_version(session):
+        return get_versions(session, [Bonus.__tablename__])[0]
+
+    @staticmethod
+    def _bump_catalog_version(session):
+        bump_version(session, Bonus.__tablename__)
+
+    @staticmethod
+    def get_bonus_by_id(bonus_id, read_your_writes=False):
+        query_result = BonusesQuery.get_bonuses(bonus_id=bonus_id, read_your_writes=read_your_writes)
 
         if query_result and len(query_result) == 1:
             bonus = query_result[0]
@@ -35,19 +65,23 @@ class BonusesQuery:
 
     @staticmethod
     def update_bonus(bonus_id, data):
+        if not data or not set(data).issubset(BonusesQuery.UPDATABLE_COLUMNS):
+            return 0
+
         with open_db_session() as session:
             try:
-                bonus_to_update = session.query(Bonus).filter(Bonus.id == bonus_id).first()
+                statement = update(Bonus).where(Bonus.id == bonus_id).values(**data) \
+                    .returning(*Bonus.__table__.columns)
+                updated_bonus = session.execute(statement).first()
 
-                if not bonus_to_update:
-                    return 0
-
-                for key, value in data.items():
-                    bonus_to_update.__setattr__(key, value)
+                if updated_bonus is None:
+                    session.rollback()
+                    return None
 
+                BonusesQuery._bump_catalog_version(session)
                 session.commit()
-                session.flush()
-                updated_bonus = bonus_to_update.to_dict()
+                BONUS_CATALOG.clear()
+                updated_bonus = Bonus.to_dict(updated_bonus)
 
             except SQLAlchemyError as error:
                 print(error)
@@ -63,7 +97,10 @@ class BonusesQuery:
                 query = session.query(Bonus).filter(Bonus.id == bonus_id)
                 query_result = query.delete()
 
+                if query_result:
+                    BonusesQuery._bump_catalog_version(session)
                 session.commit()
+                BONUS_CATALOG.clear()
 
             except SQLAlchemyError as error:
                 print(error)
@@ -80,7 +117,9 @@ class BonusesQuery:
                 session.add(new_bonus)
                 session.flush()
 
+                BonusesQuery._bump_catalog_version(session)
                 session.commit()
+                BONUS_CATALOG.clear()
                 created_bonus = new_bonus.to_dict()
 
             except SQLAlchemyError as error:
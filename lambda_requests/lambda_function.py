@@ -1,20 +1,55 @@
 from .orm_services import RequestQuery, RequestHistoryQuery
 from utils.http import *
+from utils.database import with_db_session_scope
+from utils.instrumentation import log_invocation
+from utils.pagination import parse_limit
 
 
 def get_requests(event):
-    query_params = event['queryStringParameters']
+    query_params = dict(event['queryStringParameters'] or {})
+    limit = query_params.pop('limit', None)
+    cursor = query_params.pop('cursor', None)
 
-    if not query_params:
-        requests = RequestQuery.get_requests()
-    else:
-        try:
-            requests = RequestQuery.get_requests(**query_params)
-        except KeyError:
-            return HTTP_BAD_REQUEST
+    if not set(query_params) <= set(RequestQuery.QUERY_FILTERS):
+        return HTTP_BAD_REQUEST
+
+    try:
+        if 'ids' in query_params:
+            query_params['request_ids'] = parse_id_list(query_params.pop('ids'))
+        if 'fields' in query_params:
+            query_params['fields'] = parse_fields(query_params['fields'], RequestQuery.FIELDS)
+    except ValueError:
+        return HTTP_BAD_REQUEST
+
+    if limit is not None or cursor is not None:
+        return get_requests_page(limit, cursor, query_params)
+
+    # The version is read before the rows, so a body can only be newer than its ETag, never older
+    version = RequestQuery.get_requests_version()
+    etag = build_etag(version, event['queryStringParameters']) if version else None
+
+    if etag_matches(event, etag):
+        return http_not_modified(etag)
 
-    if type(requests) is list:
-        return http_ok(requests)
+    try:
+        requests = RequestQuery.get_requests_json(**query_params)
+    except (KeyError, TypeError):
+        return HTTP_BAD_REQUEST
+
+    if type(requests) is str:
+        return http_ok_encoded(requests, etag)
+
+    return HTTP_BAD_REQUEST
+
+
+def get_requests_page(limit, cursor, filters):
+    try:
+        page = RequestQuery.get_requests_page(parse_limit(limit), cursor, **filters)
+    except (KeyError, TypeError, ValueError):
+        return HTTP_BAD_REQUEST
+
+    if type(page) is dict:
+        return http_ok(page)
 
     return HTTP_BAD_REQUEST
 
@@ -30,6 +65,10 @@ def get_request_by_id(id):
 
 def create_request(event):
     data = json.loads(event['body'])
+
+    if type(data) is list:
+        return create_requests(data)
+
     data['status'] = 'created'
 
     created_request = RequestQuery.add_new_request(data)
@@ -40,6 +79,17 @@ def create_request(event):
     return HTTP_BAD_REQUEST
 
 
+def create_requests(items):
+    result = RequestQuery.add_new_requests(items)
+
+    if not result:
+        return HTTP_BAD_REQUEST
+    if not result['created']:
+        return http_bad_request(result)
+
+    return http_created(result)
+
+
 def update_request(id, event):
     data = json.loads(event['body'])
 
@@ -47,6 +97,8 @@ def update_request(id, event):
 
     if updated_request:
         return http_ok(updated_request)
+    if updated_request is None:
+        return HTTP_NOT_FOUND
 
     return HTTP_BAD_REQUEST
 
@@ -60,10 +112,59 @@ def delete_request(id):
     return HTTP_BAD_REQUEST
 
 
-def get_request_history(id):
-    history = RequestHistoryQuery.get_history(id)
+def delete_requests(event):
+    query_params = event['queryStringParameters'] or {}
+
+    try:
+        request_ids = parse_id_list(query_params['ids'])
+    except (KeyError, ValueError):
+        return HTTP_BAD_REQUEST
+
+    deleted_ids = RequestQuery.delete_requests(request_ids)
+
+    if type(deleted_ids) is list:
+        return http_ok({'deleted': deleted_ids})
+
+    return HTTP_BAD_REQUEST
+
+
+def transition_requests(event):
+    data = json.loads(event['body'])
+
+    try:
+        request_ids = [int(request_id) for request_id in data['ids']]
+        status, expected_status, editor = data['status'], data['expected_status'], data['editor']
+    except (KeyError, TypeError, ValueError):
+        return HTTP_BAD_REQUEST
+
+    if type(data['ids']) is not list:
+        return HTTP_BAD_REQUEST
+
+    result = RequestQuery.transition_requests(request_ids, status, expected_status, editor)
+
+    if result:
+        return http_ok(result)
 
-    if type(history) is list:
+    return HTTP_BAD_REQUEST
+
+
+def get_request_history(id, event):
+    query_params = dict(event.get('queryStringParameters') or {})
+    limit = query_params.pop('limit', None)
+    cursor = query_params.pop('cursor', None)
+
+    if not set(query_params) <= set(RequestHistoryQuery.QUERY_FILTERS):
+        return HTTP_BAD_REQUEST
+
+    try:
+        if limit is not None or cursor is not None:
+            history = RequestHistoryQuery.get_history_page(id, parse_limit(limit), cursor, **query_params)
+        else:
+            history = RequestHistoryQuery.get_history(id, **query_params)
+    except (KeyError, TypeError, ValueError):
+        return HTTP_BAD_REQUEST
+
+    if type(history) in (list, dict):
         return http_ok(history)
 
     return HTTP_BAD_REQUEST
@@ -81,6 +182,10 @@ def add_request_history(id, event):
     return HTTP_BAD_REQUEST
 
 
+@log_invocation
+@with_compression
+@with_conditional_get
+@with_db_session_scope
 def lambda_handler(event, context):
     if event['resource'] == '/requests':
         if event['httpMethod'] == 'GET':
@@ -89,6 +194,9 @@ def lambda_handler(event, context):
         elif event['httpMethod'] == 'POST':
             http_response = create_request(event)
 
+        elif event['httpMethod'] == 'DELETE':
+            http_response = delete_requests(event)
+
     elif event['resource'] == '/requests/{id}':
         request_id = event['pathParameters'].get('id')
 
@@ -101,11 +209,15 @@ def lambda_handler(event, context):
         elif event['httpMethod'] == 'DELETE':
             http_response = delete_request(request_id)
 
+    elif event['resource'] == '/requests/transitions':
+        if event['httpMethod'] == 'POST':
+            http_response = transition_requests(event)
+
     elif event['resource'] == '/requests/{id}/history':
         request_id = event['pathParameters'].get('id')
 
         if event['httpMethod'] == 'GET':
-            http_response = get_request_history(request_id)
+            http_response = get_request_history(request_id, event)
 
         elif event['httpMethod'] == 'POST':
             http_response = add_request_history(request_id, event)
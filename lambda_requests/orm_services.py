@@ -1,58 +1,170 @@
+from datetime import date, datetime
+from sqlalchemy import update, insert, select, literal, func, tuple_, Integer, Date, String
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql.expression import ColumnElement as ColElem
 from sqlalchemy.exc import SQLAlchemyError
 
 from models.models import RequestHistory, Request, Worker, Bonus
-from utils.database import open_db_session
+from utils.database import open_db_session, any_of, array_param, json_array
+from utils.pagination import encode_cursor, decode_cursor
+from utils.versions import get_versions, bump_version
 
 
 class RequestQuery:
+    UPDATABLE_COLUMNS = ('status', 'creator', 'reviewer', 'bonus_type', 'payment_amount', 'payment_date',
+                         'description')
+    BULK_COLUMNS = {
+        'creator': Integer,
+        'reviewer': Integer,
+        'bonus_type': Integer,
+        'payment_amount': Integer,
+        'payment_date': Date,
+        'description': String
+    }
+    FIELDS = ('id', 'creator', 'reviewer', 'bonus_type', 'payment_amount', 'payment_date', 'status', 'description',
+              'created_at', 'bonus_name', 'creator_name', 'creator_slack_id', 'reviewer_name', 'reviewer_slack_id')
+    # Filters a client may set in the query string, the rest of the get_requests arguments are internal
+    QUERY_FILTERS = ('status', 'creator_id', 'reviewer_id', 'payment_date', 'payment_date_gt', 'payment_date_lt',
+                     'ids', 'fields')
+    # Joined fields and the join each of them needs
+    JOINED_FIELDS = {
+        'bonus_name': 'bonus',
+        'creator_name': 'creator',
+        'creator_slack_id': 'creator',
+        'reviewer_name': 'reviewer',
+        'reviewer_slack_id': 'reviewer'
+    }
+    MAX_BULK_SIZE = 10000
+    MAX_TRANSITION_SIZE = 1000
+    DEFAULT_EDITOR = 'unknown'
+
     @staticmethod
     def get_requests(request_id=None, status=None, creator_id=None, reviewer_id=None, payment_date=None,
-                     payment_date_gt=None, payment_date_lt=None):
+                     payment_date_gt=None, payment_date_lt=None, after_id=None, limit=None, request_ids=None,
+                     fields=None, read_your_writes=False):
 
-        with open_db_session() as session:
+        with open_db_session(read_only=not read_your_writes) as session:
             try:
-                creator = aliased(Worker)
-                reviewer = aliased(Worker)
-                query = session.query(Request,
-                                      ColElem.label(Bonus.type, 'bonus_name'),
-                                      ColElem.label(creator.full_name, 'creator_name'),
-                                      ColElem.label(creator.slack_id, 'creator_slack_id'),
-                                      ColElem.label(reviewer.full_name, 'reviewer_name'),
-                                      ColElem.label(reviewer.slack_id, 'reviewer_slack_id')).order_by(Request.id)
-
-                if request_id is not None:
-                    query = query.filter(Request.id == request_id)
-                if status is not None:
-                    query = query.filter(Request.status == status)
-                else:
-                    query = query.filter(Request.status != 'deleted')
-
-                if creator_id is not None:
-                    query = query.filter(Request.creator == creator_id)
-                if reviewer_id is not None:
-                    query = query.filter(Request.reviewer == reviewer_id)
-                if payment_date is not None:
-                    query = query.filter(Request.payment_date == payment_date)
-                if payment_date_gt is not None and payment_date_gt:
-                    query = query.filter(Request.payment_date > payment_date_gt)
-                if payment_date_lt is not None and payment_date_lt:
-                    query = query.filter(Request.payment_date <= payment_date_lt)
-
-                query_result = query.join(Bonus, Request.bonus_type == Bonus.id) \
-                    .join(creator, Request.creator == creator.id) \
-                    .join(reviewer, Request.reviewer == reviewer.id).all()
+                query = RequestQuery._build_requests_query(session, request_id=request_id, status=status,
+                                                           creator_id=creator_id, reviewer_id=reviewer_id,
+                                                           payment_date=payment_date, payment_date_gt=payment_date_gt,
+                                                           payment_date_lt=payment_date_lt, after_id=after_id,
+                                                           limit=limit, request_ids=request_ids, fields=fields)
+                query_result = query.all()
 
             except SQLAlchemyError as error:
                 print(error)
                 return 0
 
+        if fields is not None:
+            return RequestQuery._parse_projection(query_result)
+
         return RequestQuery._parse_requests(query_result)
 
     @staticmethod
-    def get_request_by_id(request_id):
-        query_result = RequestQuery.get_requests(request_id=request_id)
+    def get_requests_json(fields=None, read_your_writes=False, **filters):
+        with open_db_session(read_only=not read_your_writes) as session:
+            try:
+                query = RequestQuery._build_requests_query(session, fields=fields or RequestQuery.FIELDS, **filters)
+                subquery = query.subquery()
+                query_result = session.execute(json_array(subquery, subquery.c.id)).scalar()
+
+            except SQLAlchemyError as error:
+                print(error)
+                return 0
+
+        return query_result
+
+    @staticmethod
+    def get_requests_version(read_your_writes=False):
+        # Request lists embed worker and bonus names, so those versions are part of the validator too
+        with open_db_session(read_only=not read_your_writes) as session:
+            try:
+                versions = get_versions(session, [Request.__tablename__, Worker.__tablename__, Bonus.__tablename__])
+
+            except SQLAlchemyError as error:
+                print(error)
+                return 0
+
+        return versions
+
+    @staticmethod
+    def _build_requests_query(session, request_id=None, status=None, creator_id=None, reviewer_id=None,
+                              payment_date=None, payment_date_gt=None, payment_date_lt=None, after_id=None,
+                              limit=None, request_ids=None, fields=None):
+        creator = aliased(Worker)
+        reviewer = aliased(Worker)
+        joined_columns = {
+            'bonus_name': Bonus.type,
+            'creator_name': creator.full_name,
+            'creator_slack_id': creator.slack_id,
+            'reviewer_name': reviewer.full_name,
+            'reviewer_slack_id': reviewer.slack_id
+        }
+
+        if fields is None:
+            query = session.query(Request, *(ColElem.label(column, name) for name, column in joined_columns.items()))
+            joins = set(RequestQuery.JOINED_FIELDS.values())
+        else:
+            query = session.query(*(ColElem.label(joined_columns[field], field) if field in joined_columns
+                                    else getattr(Request, field) for field in fields))
+            joins = {RequestQuery.JOINED_FIELDS[field] for field in fields if field in RequestQuery.JOINED_FIELDS}
+
+        query = query.order_by(Request.id)
+
+        if request_id is not None:
+            query = query.filter(Request.id == request_id)
+        if request_ids is not None:
+            query = query.filter(any_of(Request.id, request_ids))
+        if status is not None:
+            query = query.filter(Request.status == status)
+        else:
+            # Matches the ix_requests_active_id predicate, so the planner can use the partial index
+            query = query.filter(Request.status != 'deleted')
+
+        if creator_id is not None:
+            query = query.filter(Request.creator == creator_id)
+        if reviewer_id is not None:
+            query = query.filter(Request.reviewer == reviewer_id)
+        if payment_date is not None:
+            query = query.filter(Request.payment_date == payment_date)
+        if payment_date_gt is not None and payment_date_gt:
+            query = query.filter(Request.payment_date > payment_date_gt)
+        if payment_date_lt is not None and payment_date_lt:
+            query = query.filter(Request.payment_date <= payment_date_lt)
+        if after_id is not None:
+            query = query.filter(Request.id > after_id)
+
+        # A join that no requested field needs is replaced by the NOT NULL check the inner join implied
+        for name, target, foreign_key in (('bonus', Bonus, Request.bonus_type), ('creator', creator, Request.creator),
+                                          ('reviewer', reviewer, Request.reviewer)):
+            if name in joins:
+                query = query.join(target, foreign_key == target.id)
+            else:
+                query = query.filter(foreign_key.isnot(None))
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return query
+
+    @staticmethod
+    def get_requests_page(limit, cursor=None, **filters):
+        # Keyset pagination on Request.id: every page is an index range scan, however deep it is
+        after_id = int(decode_cursor(cursor)['id']) if cursor else None
+
+        query_result = RequestQuery.get_requests(after_id=after_id, limit=limit + 1, **filters)
+        if type(query_result) is not list:
+            return query_result
+
+        items = query_result[:limit]
+        next_cursor = encode_cursor({'id': items[-1]['id']}) if len(query_result) > limit else None
+
+        return {'items': items, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def get_request_by_id(request_id, read_your_writes=False):
+        query_result = RequestQuery.get_requests(request_id=request_id, read_your_writes=read_your_writes)
 
         if query_result and len(query_result) == 1:
             request = query_result[0]
@@ -62,17 +174,34 @@ class RequestQuery:
 
     @staticmethod
     def update_request(request_id, data):
-        with open_db_session() as session:
-            try:
-                request_to_update = session.query(Request).filter(Request.id == request_id).first()
+        editor = data.pop('editor', RequestQuery.DEFAULT_EDITOR)
 
-                for key, value in data.items():
-                    print(key, value)
-                    request_to_update.__setattr__(key, value)
+        if not data or not set(data).issubset(RequestQuery.UPDATABLE_COLUMNS):
+            return 0
 
+        with open_db_session() as session:
+            try:
+                # Old values come back from a locked self-join, so the diff needs no extra SELECT
+                requests_table = Request.__table__
+                old_request = select(requests_table).where(requests_table.c.id == request_id) \
+                    .with_for_update().subquery('old_request')
+                statement = update(requests_table).where(requests_table.c.id == old_request.c.id) \
+                    .values(**data, updated_at=func.now()) \
+                    .returning(*requests_table.columns,
+                               *(old_request.c[column].label(f'old_{column}') for column in data))
+                updated_request = session.execute(statement).first()
+
+                if updated_request is None:
+                    session.rollback()
+                    return None
+
+                history = RequestQuery._build_history(updated_request, data, editor)
+                if history:
+                    session.execute(insert(RequestHistory), history)
+
+                bump_version(session, Request.__tablename__)
                 session.commit()
-                session.flush()
-                updated_request = request_to_update.to_dict()
+                updated_request = Request.to_dict(updated_request)
 
             except SQLAlchemyError as error:
                 print(error)
@@ -82,21 +211,38 @@ class RequestQuery:
         return updated_request
 
     @staticmethod
-    def delete_request(request_id):
-        with open_db_session() as session:
-            try:
-                query = session.query(Request).filter(Request.id == request_id)
+    def _build_history(updated_request, data, editor):
+        history = []
 
-                request_to_delete = query.first()
-                if not request_to_delete:
-                    return 0
+        for column in data:
+            old_value, new_value = updated_request[f'old_{column}'], updated_request[column]
 
-                request_to_delete = request_to_delete.to_dict()
-                if request_to_delete['status'] == 'deleted':
-                    return 0
+            if old_value != new_value:
+                changes = f'{column}: {old_value} -> {new_value}'
+                history.append({'request_id': updated_request.id, 'changes': changes[:300], 'editor': editor})
+
+        return history
+
+    @staticmethod
+    def delete_request(request_id):
+        deleted_ids = RequestQuery.delete_requests([request_id])
 
-                query_result = query.update({'status': 'deleted'})
+        return len(deleted_ids) if deleted_ids else 0
 
+    @staticmethod
+    def delete_requests(request_ids):
+        # Soft delete in one conditional statement, so concurrent deletes cannot both succeed
+        with open_db_session() as session:
+            try:
+                statement = update(Request) \
+                    .where(any_of(Request.id, request_ids), Request.status != 'deleted') \
+                    .values(status='deleted', updated_at=func.now()) \
+                    .returning(Request.id) \
+                    .execution_options(synchronize_session=False)
+                deleted_ids = session.execute(statement).scalars().all()
+
+                if deleted_ids:
+                    bump_version(session, Request.__tablename__)
                 session.commit()
 
             except SQLAlchemyError as error:
@@ -104,7 +250,7 @@ class RequestQuery:
                 session.rollback()
                 return 0
 
-        return query_result
+        return deleted_ids
 
     @staticmethod
     def add_new_request(data):
@@ -114,6 +260,7 @@ class RequestQuery:
                 session.add(new_request)
                 session.flush()
 
+                bump_version(session, Request.__tablename__)
                 session.commit()
                 created_request = new_request.to_dict()
 
@@ -124,6 +271,151 @@ class RequestQuery:
 
         return created_request
 
+    @staticmethod
+    def transition_requests(request_ids, status, expected_status, editor):
+        if not 0 < len(request_ids) <= RequestQuery.MAX_TRANSITION_SIZE:
+            return 0
+
+        with open_db_session() as session:
+            try:
+                # The status UPDATE and the history INSERT are one statement, hence one round trip and one transaction
+                updated_requests = update(Request.__table__) \
+                    .where(any_of(Request.id, request_ids), Request.status == expected_status) \
+                    .values(status=status, updated_at=func.now()) \
+                    .returning(Request.id) \
+                    .cte('updated_requests')
+                # Same changes format as the per-field history written by update_request
+                changes = f'status: {expected_status} -> {status}'
+                history = select(updated_requests.c.id, literal(changes), literal(editor))
+                statement = insert(RequestHistory) \
+                    .from_select(['request_id', 'changes', 'editor'], history) \
+                    .returning(RequestHistory.request_id)
+
+                updated_ids = sorted(session.execute(statement).scalars())
+                if updated_ids:
+                    bump_version(session, Request.__tablename__)
+                session.commit()
+
+            except SQLAlchemyError as error:
+                print(error)
+                session.rollback()
+                return 0
+
+        skipped_ids = sorted(set(request_ids) - set(updated_ids))
+
+        return {'updated': updated_ids, 'skipped': skipped_ids}
+
+    @staticmethod
+    def add_new_requests(items):
+        if not 0 < len(items) <= RequestQuery.MAX_BULK_SIZE:
+            return 0
+
+        rows, errors = RequestQuery._validate_new_requests(items)
+        if rows is None:
+            return 0
+
+        created_requests = []
+
+        if rows:
+            with open_db_session() as session:
+                try:
+                    # One INSERT ... SELECT FROM unnest(...) for the whole batch: one parameter per column, not per row
+                    source = func.unnest(*(array_param([row[column] for row in rows], column_type)
+                                           for column, column_type in RequestQuery.BULK_COLUMNS.items())) \
+                        .table_valued(*RequestQuery.BULK_COLUMNS).render_derived(name='new_requests')
+                    columns = [source.c[column] for column in RequestQuery.BULK_COLUMNS]
+                    statement = insert(Request) \
+                        .from_select([*RequestQuery.BULK_COLUMNS, 'status'], select(*columns, literal('created'))) \
+                        .returning(*Request.__table__.columns)
+
+                    created_requests = [Request.to_dict(row) for row in session.execute(statement)]
+                    bump_version(session, Request.__tablename__)
+                    session.commit()
+
+                except SQLAlchemyError as error:
+                    print(error)
+                    session.rollback()
+                    return 0
+
+        return {'created': created_requests, 'errors': errors}
+
+    @staticmethod
+    def _validate_new_requests(items):
+        rows, errors = [], []
+
+        for index, item in enumerate(items):
+            row, error = RequestQuery._validate_new_request(item)
+
+            if error:
+                errors.append({'index': index, 'message': error})
+            else:
+                rows.append((index, row))
+
+        rows = RequestQuery._check_references(rows, errors)
+        if rows is None:
+            return None, None
+
+        errors.sort(key=lambda error: error['index'])
+
+        return [row for index, row in rows], errors
+
+    @staticmethod
+    def _validate_new_request(item):
+        if not isinstance(item, dict):
+            return None, 'Request must be an object'
+
+        item = {key: value for key, value in item.items() if key != 'status'}
+        unknown = set(item) - set(RequestQuery.BULK_COLUMNS)
+        if unknown:
+            return None, f'Unknown fields: {", ".join(sorted(unknown))}'
+
+        row = {'description': item.get('description', '')}
+
+        for column in ('creator', 'reviewer', 'bonus_type', 'payment_amount'):
+            if type(item.get(column)) is not int:
+                return None, f'{column} must be an integer'
+            row[column] = item[column]
+
+        try:
+            row['payment_date'] = date.fromisoformat(item.get('payment_date'))
+        except (TypeError, ValueError):
+            return None, 'payment_date must be a date in YYYY-MM-DD format'
+
+        if not isinstance(row['description'], str) or len(row['description']) > 100:
+            return None, 'description must be a string of at most 100 characters'
+
+        return row, None
+
+    @staticmethod
+    def _check_references(rows, errors):
+        worker_ids = {row[column] for index, row in rows for column in ('creator', 'reviewer')}
+        bonus_ids = {row['bonus_type'] for index, row in rows}
+
+        with open_db_session() as session:
+            try:
+                existing_workers = set(session.execute(select(Worker.id).where(any_of(Worker.id, worker_ids))).scalars())
+                existing_bonuses = set(session.execute(select(Bonus.id).where(any_of(Bonus.id, bonus_ids))).scalars())
+
+            except SQLAlchemyError as error:
+                print(error)
+                return None
+
+        checked_rows = []
+
+        for index, row in rows:
+            if row['creator'] not in existing_workers or row['reviewer'] not in existing_workers:
+                errors.append({'index': index, 'message': 'creator and reviewer must be existing workers'})
+            elif row['bonus_type'] not in existing_bonuses:
+                errors.append({'index': index, 'message': 'bonus_type must be an existing bonus'})
+            else:
+                checked_rows.append((index, row))
+
+        return checked_rows
+
+    @staticmethod
+    def _parse_projection(rows):
+        return [row._asdict() for row in rows]
+
     @staticmethod
     def _parse_requests(requests):
         parsed_requests = list()
@@ -141,15 +433,70 @@ class RequestQuery:
 
 
 class RequestHistoryQuery:
+    QUERY_FILTERS = ('since', 'until')
+
     @staticmethod
-    def get_history(request_id):
-        with open_db_session() as session:
-            query = session.query(RequestHistory).filter(RequestHistory.request_id == request_id)
+    def get_history(request_id, since=None, until=None, after=None, limit=None, read_your_writes=False):
+        with open_db_session(read_only=not read_your_writes) as session:
+            try:
+                query = RequestHistoryQuery._build_history_query(session, request_id, since=since, until=until,
+                                                                 after=after, limit=limit)
+                query_result = query.all()
 
-            query_result = query.all()
+            except SQLAlchemyError as error:
+                print(error)
+                session.rollback()
+                return 0
 
         return RequestHistoryQuery._parse_history(query_result)
 
+    @staticmethod
+    def get_history_page(request_id, limit, cursor=None, since=None, until=None):
+        # Keyset pagination on (timestamp, id), the id breaks ties between entries written in one transaction
+        after = None
+        if cursor:
+            position = decode_cursor(cursor)
+            after = (position['timestamp'], int(position['id']))
+
+        query_result = RequestHistoryQuery.get_history(request_id, since=since, until=until, after=after,
+                                                       limit=limit + 1)
+        if type(query_result) is not list:
+            return query_result
+
+        items = query_result[:limit]
+        next_cursor = None
+        if len(query_result) > limit:
+            next_cursor = encode_cursor({'timestamp': items[-1]['timestamp'].isoformat(), 'id': items[-1]['id']})
+
+        return {'items': items, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def _parse_timestamp(value):
+        # fromisoformat only takes a trailing Z from Python 3.11, JS toISOString() always sends one
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value)
+
+    @staticmethod
+    def _build_history_query(session, request_id, since=None, until=None, after=None, limit=None):
+        # Every filter is a range on ix_requests_history_request_timestamp, rows come back in index order
+        query = session.query(RequestHistory).filter(RequestHistory.request_id == request_id) \
+            .order_by(RequestHistory.timestamp, RequestHistory.id)
+
+        if since is not None:
+            query = query.filter(RequestHistory.timestamp >= RequestHistoryQuery._parse_timestamp(since))
+        if until is not None:
+            query = query.filter(RequestHistory.timestamp < RequestHistoryQuery._parse_timestamp(until))
+        if after is not None:
+            timestamp, history_id = after
+            query = query.filter(tuple_(RequestHistory.timestamp, RequestHistory.id) >
+                                 tuple_(RequestHistoryQuery._parse_timestamp(timestamp), history_id))
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return query
+
     @staticmethod
     def add_history(data):
         with open_db_session() as session:
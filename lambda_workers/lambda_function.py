@@ -1,27 +1,62 @@
 from .orm_services import WorkersQuery
 from utils.http import *
+from utils.database import with_db_session_scope
+from utils.instrumentation import log_invocation
 
 
 def get_workers(event):
-    query_params = event['queryStringParameters']
-    if query_params and 'slack_id' in query_params:
+    query_params = event['queryStringParameters'] or {}
+
+    try:
+        fields = parse_fields(query_params['fields'], WorkersQuery.FIELDS) if 'fields' in query_params else None
+    except ValueError:
+        return HTTP_BAD_REQUEST
+
+    # A single worker by slack_id may come from WORKERS_CACHE, which can lag behind the version, so only lists
+    # get an ETag from it; the version is read before the rows, so a body is never older than its ETag
+    is_list = 'ids' in query_params or 'slack_ids' in query_params or 'slack_id' not in query_params
+    version = WorkersQuery.get_workers_version() if is_list else None
+    etag = build_etag(version, query_params) if version else None
+
+    if etag_matches(event, etag):
+        return http_not_modified(etag)
+
+    if 'ids' in query_params or 'slack_ids' in query_params:
+        return get_workers_by_ids(query_params, fields, etag)
+
+    elif 'slack_id' in query_params:
         slack_id = query_params.get('slack_id')
         worker = WorkersQuery.get_worker_by_slack_id(slack_id)
 
         if worker:
             return http_ok(worker)
 
-    elif query_params and 'role' in query_params:
+    elif 'role' in query_params:
         role = query_params.get('role')
-        workers = WorkersQuery.get_workers(role=role)
+        workers = WorkersQuery.get_workers_json(role=role, fields=fields)
 
-        if type(workers) is list:
-            return http_ok(workers)
+        if type(workers) is str:
+            return http_ok_encoded(workers, etag)
 
     else:
-        workers = WorkersQuery.get_workers()
-        if type(workers) is list:
-            return http_ok(workers)
+        workers = WorkersQuery.get_workers_json(fields=fields)
+        if type(workers) is str:
+            return http_ok_encoded(workers, etag)
+
+    return HTTP_BAD_REQUEST
+
+
+def get_workers_by_ids(query_params, fields=None, etag=None):
+    try:
+        worker_ids = parse_id_list(query_params['ids']) if 'ids' in query_params else None
+        slack_ids = parse_id_list(query_params['slack_ids'], item_type=str) if 'slack_ids' in query_params else None
+    except ValueError:
+        return HTTP_BAD_REQUEST
+
+    workers = WorkersQuery.get_workers_json(worker_ids=worker_ids, slack_ids=slack_ids, fields=fields)
+
+    if type(workers) is str:
+        return http_ok_encoded(workers, etag)
 
     return HTTP_BAD_REQUEST
 
@@ -53,6 +88,22 @@ def update_worker(id, event):
 
     if updated_worker:
         return http_ok(updated_worker)
+    if updated_worker is None:
+        return HTTP_NOT_FOUND
+
+    return HTTP_BAD_REQUEST
+
+
+def sync_workers(event):
+    items = json.loads(event['body'])
+
+    if type(items) is not list:
+        return HTTP_BAD_REQUEST
+
+    result = WorkersQuery.sync_workers(items)
+
+    if result:
+        return http_ok(result)
 
     return HTTP_BAD_REQUEST
 
@@ -66,6 +117,10 @@ def delete_worker(id):
     return HTTP_BAD_REQUEST
 
 
+@log_invocation
+@with_compression
+@with_conditional_get
+@with_db_session_scope
 def lambda_handler(event, context):
     if event['resource'] == '/workers':
         if event['httpMethod'] == 'GET':
@@ -86,6 +141,10 @@ def lambda_handler(event, context):
         elif event['httpMethod'] == 'DELETE':
             http_response = delete_worker(worker_id)
 
+    elif event['resource'] == '/workers/sync':
+        if event['httpMethod'] == 'POST':
+            http_response = sync_workers(event)
+
     else:
         http_response = HTTP_NOT_FOUND
 
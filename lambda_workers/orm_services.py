@@ -1,112 +1,212 @@
+import os
+from sqlalchemy import update, delete, select, exists, func, or_, case, literal_column, all_, Integer, String
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
 from sqlalchemy.exc import SQLAlchemyError
 
 from models.models import Worker, WorkersRolesRelation, Role
-from utils.database import open_db_session
+from utils.cache import TTLCache
+from utils.database import open_db_session, any_of, array_param, json_array
+from utils.versions import get_versions, bump_version
+
+# Lives for the whole life of the container; other containers may serve a changed worker for up to the TTL
+WORKERS_CACHE = TTLCache('workers', maxsize=int(os.environ.get('WORKERS_CACHE_SIZE') or 1024),
+                         ttl=float(os.environ.get('WORKERS_CACHE_TTL') or 60))
 
 
 class WorkersQuery:
+    UPDATABLE_COLUMNS = ('full_name', 'position', 'slack_id')
+    FIELDS = ('id', 'full_name', 'position', 'slack_id', 'roles')
+    SYNC_FIELDS = ('full_name', 'position', 'slack_id', 'roles')
+    MAX_SYNC_SIZE = 50000
+    DEFAULT_ROLE = 1
+
     @staticmethod
-    def get_workers(worker_id=None, slack_id=None, role=None):
-        with open_db_session() as session:
+    def get_workers(worker_id=None, slack_id=None, role=None, worker_ids=None, slack_ids=None, fields=None,
+                    read_your_writes=False):
+        with open_db_session(read_only=not read_your_writes) as session:
             try:
-                query = session.query(Worker, WorkersRolesRelation.role_id, Role.role_name)
+                query_result = WorkersQuery._query_workers(session, worker_id=worker_id, slack_id=slack_id, role=role,
+                                                           worker_ids=worker_ids, slack_ids=slack_ids, fields=fields)
 
-                if worker_id is not None:
-                    query = query.filter(Worker.id == worker_id)
-                if slack_id is not None:
-                    query = query.filter(Worker.slack_id == slack_id)
-                if role is not None:
-                    query = query.filter(Role.role_name == role)
+            except SQLAlchemyError as error:
+                print(error)
+                return 0
 
-                query = query.join(WorkersRolesRelation, Worker.id == WorkersRolesRelation.worker_id) \
-                    .join(Role, WorkersRolesRelation.role_id == Role.id)
+        return WorkersQuery._parse_workers(query_result)
 
-                query_result = query.all()
+    @staticmethod
+    def get_workers_json(fields=None, read_your_writes=False, **filters):
+        with open_db_session(read_only=not read_your_writes) as session:
+            try:
+                subquery = WorkersQuery._build_workers_query(session, fields=fields, **filters).subquery()
+                query_result = session.execute(json_array(subquery, subquery.c.id)).scalar()
 
             except SQLAlchemyError as error:
                 print(error)
                 return 0
 
-        return WorkersQuery._parse_workers(query_result)
+        return query_result
 
     @staticmethod
-    def get_worker_by_id(worker_id):
-        query_result = WorkersQuery.get_workers(worker_id=worker_id)
+    def get_workers_version(read_your_writes=False):
+        with open_db_session(read_only=not read_your_writes) as session:
+            try:
+                versions = get_versions(session, [Worker.__tablename__])
 
-        if query_result and len(query_result) == 1:
-            worker = query_result[0]
-            return worker
+            except SQLAlchemyError as error:
+                print(error)
+                return 0
 
-        return 0
+        return versions
+
+    @staticmethod
+    def _query_workers(session, **filters):
+        return WorkersQuery._build_workers_query(session, **filters).all()
+
+    @staticmethod
+    def _build_workers_query(session, worker_id=None, slack_id=None, role=None, worker_ids=None, slack_ids=None,
+                             fields=None):
+        fields = fields or WorkersQuery.FIELDS
+
+        if 'roles' not in fields:
+            return WorkersQuery._build_workers_query_without_roles(session, fields, worker_id=worker_id,
+                                                                   slack_id=slack_id, role=role, worker_ids=worker_ids,
+                                                                   slack_ids=slack_ids)
+
+        # One row of scalars per worker, roles are collected by Postgres instead of regrouped in Python
+        roles = func.array_agg(aggregate_order_by(Role.role_name, WorkersRolesRelation.id)).label('roles')
+        query = session.query(*(roles if field == 'roles' else getattr(Worker, field) for field in fields))
+
+        if worker_id is not None:
+            query = query.filter(Worker.id == worker_id)
+        if slack_id is not None:
+            query = query.filter(Worker.slack_id == slack_id)
+        if role is not None:
+            query = query.filter(Role.role_name == role)
+        if worker_ids is not None:
+            query = query.filter(any_of(Worker.id, worker_ids))
+        if slack_ids is not None:
+            query = query.filter(any_of(Worker.slack_id, slack_ids, String))
+
+        query = query.join(WorkersRolesRelation, Worker.id == WorkersRolesRelation.worker_id) \
+            .join(Role, WorkersRolesRelation.role_id == Role.id) \
+            .group_by(Worker.id).order_by(Worker.id)
+
+        return query
 
     @staticmethod
-    def get_worker_by_slack_id(slack_id):
-        query_result = WorkersQuery.get_workers(slack_id=slack_id)
+    def _build_workers_query_without_roles(session, fields, worker_id=None, slack_id=None, role=None, worker_ids=None,
+                                           slack_ids=None):
+        # No join and no grouping; EXISTS keeps the same workers the roles join would return
+        has_roles = exists().where(WorkersRolesRelation.worker_id == Worker.id)
+        if role is not None:
+            has_roles = has_roles.where(WorkersRolesRelation.role_id == Role.id, Role.role_name == role)
+
+        query = session.query(*(getattr(Worker, field) for field in fields)).filter(has_roles)
+
+        if worker_id is not None:
+            query = query.filter(Worker.id == worker_id)
+        if slack_id is not None:
+            query = query.filter(Worker.slack_id == slack_id)
+        if worker_ids is not None:
+            query = query.filter(any_of(Worker.id, worker_ids))
+        if slack_ids is not None:
+            query = query.filter(any_of(Worker.slack_id, slack_ids, String))
+
+        return query.order_by(Worker.id)
+
+    @staticmethod
+    def get_worker_by_id(worker_id, read_your_writes=False):
+        return WorkersQuery._get_single_worker(('id', str(worker_id)), read_your_writes, worker_id=worker_id)
+
+    @staticmethod
+    def get_worker_by_slack_id(slack_id, read_your_writes=False):
+        return WorkersQuery._get_single_worker(('slack_id', slack_id), read_your_writes, slack_id=slack_id)
+
+    @staticmethod
+    def _get_single_worker(cache_key, read_your_writes, **filters):
+        # Reads that must see the caller's own writes skip the cache and go to the primary
+        worker = None if read_your_writes else WORKERS_CACHE.get(cache_key)
+        if worker is not None:
+            return worker
+
+        # Misses are filled from the primary: a lagging replica could otherwise put back the worker as it was before
+        # a write this container has just made, and keep it cached for the whole TTL
+        query_result = WorkersQuery.get_workers(read_your_writes=True, **filters)
 
         if query_result and len(query_result) == 1:
             worker = query_result[0]
+            WORKERS_CACHE.set(('id', str(worker['id'])), worker)
+            WORKERS_CACHE.set(('slack_id', worker['slack_id']), worker)
             return worker
 
         return 0
 
     @staticmethod
     def _parse_workers(workers_data):
-        parsed_result = {}
-
-        for item in workers_data:
-            if item['Worker'].id not in parsed_result:
-                parsed_result[item['Worker'].id] = {
-                    'id': item['Worker'].id,
-                    'full_name': item['Worker'].full_name,
-                    'position': item['Worker'].position,
-                    'slack_id': item['Worker'].slack_id,
-                    'roles': [item['role_name']]
-                }
-            else:
-                parsed_result[item['Worker'].id]['roles'].append(item['role_name'])
+        parsed_result = [item._asdict() for item in workers_data]
 
-        return list(parsed_result.values())
+        return parsed_result
 
     @staticmethod
     def update_worker(worker_id, data):
-        with open_db_session() as session:
-            try:
-                worker = WorkersQuery.get_worker_by_id(worker_id)
-                if not worker:
-                    return 0
+        roles_data = data.pop('roles', None)
 
-                roles_data = data.pop('roles', None)
-
-                if roles_data is not None and roles_data != worker['roles']:
-                    worker_roles = session.query(WorkersRolesRelation)\
-                        .filter(WorkersRolesRelation.worker_id == worker_id).all()
+        if not set(data).issubset(WorkersQuery.UPDATABLE_COLUMNS):
+            return 0
 
-                    for worker_role in worker_roles:
-                        if worker_role.role_id not in roles_data:
-                            session.query(WorkersRolesRelation)\
-                                .filter(WorkersRolesRelation.id == worker_role.id).delete()
-                        else:
-                            roles_data.remove(worker_role.role_id)
+        # Workers are read through an inner join on their roles, one left without roles would vanish from every GET
+        if roles_data is not None and (not isinstance(roles_data, list) or not roles_data
+                                       or any(type(role_id) is not int for role_id in roles_data)):
+            return 0
 
-                    if len(roles_data) > 0:
-                        new_roles = [WorkersRolesRelation(worker['id'], role) for role in roles_data]
-                        session.add_all(new_roles)
+        # Update, role sync and the re-read all run in one session and one transaction
+        with open_db_session() as session:
+            try:
+                if data:
+                    statement = update(Worker).where(Worker.id == worker_id).values(**data).returning(Worker.id)
+                else:
+                    statement = session.query(Worker.id).filter(Worker.id == worker_id).statement
 
-                worker_to_update = session.query(Worker).filter(Worker.id == worker_id).first()
+                if session.execute(statement).first() is None:
+                    session.rollback()
+                    return None
 
-                for key, value in data.items():
-                    worker_to_update.__setattr__(key, value)
+                roles_changed = 0
+                if roles_data is not None:
+                    roles_changed = WorkersQuery._sync_roles(session, worker_id, roles_data)
 
-                session.commit()
                 session.flush()
-                updated_worker = WorkersQuery.get_worker_by_id(worker_id)
+                updated_worker = WorkersQuery._parse_workers(WorkersQuery._query_workers(session, worker_id=worker_id))
+                if data or roles_changed:
+                    bump_version(session, Worker.__tablename__)
+                session.commit()
+                # A changed slack_id leaves entries under the old key, so every write drops the whole cache
+                WORKERS_CACHE.clear()
 
             except SQLAlchemyError as error:
                 print(error)
                 session.rollback()
                 return 0
 
-        return updated_worker
+        return updated_worker[0] if updated_worker else 0
+
+    @staticmethod
+    def _sync_roles(session, worker_id, roles_data):
+        # Two statements whatever the number of roles: drop what is not kept, add what is missing
+        keep_roles = list(dict.fromkeys(roles_data))
+
+        statement = delete(WorkersRolesRelation).where(WorkersRolesRelation.worker_id == worker_id,
+                                                       WorkersRolesRelation.role_id != all_(array_param(keep_roles)))
+        changed = session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+        if keep_roles:
+            statement = insert(WorkersRolesRelation) \
+                .values([{'worker_id': worker_id, 'role_id': role_id} for role_id in keep_roles]) \
+                .on_conflict_do_nothing(index_elements=[WorkersRolesRelation.worker_id, WorkersRolesRelation.role_id])
+            changed += session.execute(statement).rowcount
+
+        return changed
 
     @staticmethod
     def delete_worker(worker_id):
@@ -115,7 +215,10 @@ class WorkersQuery:
                 query = session.query(Worker).filter(Worker.id == worker_id)
                 query_result = query.delete()
 
+                if query_result:
+                    bump_version(session, Worker.__tablename__)
                 session.commit()
+                WORKERS_CACHE.clear()
 
             except SQLAlchemyError as error:
                 print(error)
@@ -135,13 +238,15 @@ class WorkersQuery:
                 session.flush()
 
                 if roles_data is not None:
-                    new_roles = [WorkersRolesRelation(new_worker.id, role) for role in roles_data]
+                    new_roles = [WorkersRolesRelation(new_worker.id, role) for role in dict.fromkeys(roles_data)]
                     session.add_all(new_roles)
                 else:
                     new_role = WorkersRolesRelation(new_worker.id, 1)
                     session.add(new_role)
 
+                bump_version(session, Worker.__tablename__)
                 session.commit()
+                WORKERS_CACHE.clear()
                 created_worker = new_worker.to_dict()
 
             except SQLAlchemyError as error:
@@ -150,3 +255,175 @@ class WorkersQuery:
                 return 0
 
         return created_worker
+
+    @staticmethod
+    def sync_workers(items):
+        if not 0 < len(items) <= WorkersQuery.MAX_SYNC_SIZE:
+            return 0
+
+        rows, errors = WorkersQuery._validate_directory(items)
+        if rows is None:
+            return 0
+
+        result = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': errors}
+
+        if not rows:
+            return result
+
+        # The whole directory goes through three statements in one transaction: upsert, role DELETE, role INSERT
+        with open_db_session() as session:
+            try:
+                synced = session.execute(WorkersQuery._build_upsert(rows)).all()
+                created = {slack_id for slack_id, is_created in synced if is_created}
+
+                # Workers sent without roles keep theirs, new ones get the default role like add_new_worker
+                role_pairs = [(row['slack_id'], role_id) for row in rows if row['roles'] is not None
+                              for role_id in row['roles']]
+                role_pairs += [(row['slack_id'], WorkersQuery.DEFAULT_ROLE) for row in rows
+                               if row['roles'] is None and row['slack_id'] in created]
+
+                roles_changed = WorkersQuery._reconcile_roles(
+                    session, [row['slack_id'] for row in rows if row['roles'] is not None], role_pairs)
+                # A scheduled sync of an unchanged directory must not invalidate every /workers and /requests ETag
+                if synced or roles_changed:
+                    bump_version(session, Worker.__tablename__)
+                session.commit()
+                WORKERS_CACHE.clear()
+
+            except SQLAlchemyError as error:
+                print(error)
+                session.rollback()
+                return 0
+
+        result.update(created=len(created), updated=len(synced) - len(created), unchanged=len(rows) - len(synced))
+
+        return result
+
+    @staticmethod
+    def _build_upsert(rows):
+        columns = WorkersQuery.UPDATABLE_COLUMNS
+        source = func.unnest(*(array_param([row[column] for row in rows], String) for column in columns)) \
+            .table_valued(*columns).render_derived(name='directory')
+        # Entries without position keep the stored one like roles, new workers get '' like add_new_worker
+        existing = exists().where(Worker.slack_id == source.c.slack_id)
+        values = {column: source.c[column] for column in columns}
+        values['position'] = func.coalesce(source.c.position, case((~existing, '')))
+        statement = insert(Worker).from_select(columns, select(*(values[column] for column in columns)))
+        position = func.coalesce(statement.excluded.position, Worker.position)
+
+        # Unchanged workers are not rewritten and not returned; xmax = 0 marks rows that were inserted
+        return statement.on_conflict_do_update(
+            index_elements=[Worker.slack_id],
+            set_={'full_name': statement.excluded.full_name, 'position': position},
+            where=or_(Worker.full_name.is_distinct_from(statement.excluded.full_name),
+                      Worker.position.is_distinct_from(position))
+        ).returning(Worker.slack_id, literal_column('xmax = 0'))
+
+    @staticmethod
+    def _reconcile_roles(session, slack_ids, role_pairs):
+        pairs = func.unnest(array_param([slack_id for slack_id, role_id in role_pairs], String),
+                            array_param([role_id for slack_id, role_id in role_pairs], Integer)) \
+            .table_valued('slack_id', 'role_id').render_derived(name='directory_roles')
+        changed = 0
+
+        if slack_ids:
+            wanted = exists().where(pairs.c.slack_id == Worker.slack_id,
+                                    pairs.c.role_id == WorkersRolesRelation.role_id)
+            statement = delete(WorkersRolesRelation).where(WorkersRolesRelation.worker_id == Worker.id,
+                                                           any_of(Worker.slack_id, slack_ids, String), ~wanted)
+            changed += session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+        if role_pairs:
+            statement = insert(WorkersRolesRelation) \
+                .from_select(['worker_id', 'role_id'],
+                             select(Worker.id, pairs.c.role_id).join(pairs, pairs.c.slack_id == Worker.slack_id)) \
+                .on_conflict_do_nothing(index_elements=[WorkersRolesRelation.worker_id, WorkersRolesRelation.role_id])
+            changed += session.execute(statement).rowcount
+
+        return changed
+
+    @staticmethod
+    def _validate_directory(items):
+        rows, errors, seen, seen_names = [], [], set(), set()
+
+        for index, item in enumerate(items):
+            row, error = WorkersQuery._validate_directory_entry(item)
+
+            if error is None and row['slack_id'] in seen:
+                error = f'Duplicated slack_id: {row["slack_id"]}'
+            elif error is None and row['full_name'] in seen_names:
+                error = f'Duplicated full_name: {row["full_name"]}'
+
+            if error:
+                errors.append({'index': index, 'message': error})
+            else:
+                seen.add(row['slack_id'])
+                seen_names.add(row['full_name'])
+                rows.append((index, row))
+
+        if rows:
+            rows = WorkersQuery._check_directory_references(rows, errors)
+            if rows is None:
+                return None, None
+
+        errors.sort(key=lambda error: error['index'])
+
+        return [row for index, row in rows], errors
+
+    @staticmethod
+    def _check_directory_references(rows, errors):
+        role_ids = {role_id for index, row in rows if row['roles'] for role_id in row['roles']}
+        full_names = [row['full_name'] for index, row in rows]
+
+        with open_db_session() as session:
+            try:
+                existing_roles = set(session.execute(select(Role.id).where(any_of(Role.id, role_ids))).scalars())
+                # full_name is unique too, a name held by another slack_id would fail the whole upsert
+                name_owners = dict(session.execute(select(Worker.full_name, Worker.slack_id)
+                                                   .where(any_of(Worker.full_name, full_names, String))).all())
+
+            except SQLAlchemyError as error:
+                print(error)
+                return None
+
+        checked_rows = []
+
+        for index, row in rows:
+            if row['roles'] and not set(row['roles']) <= existing_roles:
+                errors.append({'index': index, 'message': 'roles must be existing roles'})
+            elif name_owners.get(row['full_name'], row['slack_id']) != row['slack_id']:
+                errors.append({'index': index, 'message': f'full_name is taken by another worker: {row["full_name"]}'})
+            else:
+                checked_rows.append((index, row))
+
+        return checked_rows
+
+    @staticmethod
+    def _validate_directory_entry(item):
+        if not isinstance(item, dict):
+            return None, 'Worker must be an object'
+
+        unknown = set(item) - set(WorkersQuery.SYNC_FIELDS)
+        if unknown:
+            return None, f'Unknown fields: {", ".join(sorted(unknown))}'
+
+        row = {'full_name': item.get('full_name'), 'slack_id': item.get('slack_id'),
+               'position': item.get('position'), 'roles': item.get('roles')}
+
+        for column, max_length in (('full_name', 50), ('slack_id', 11), ('position', 100)):
+            if column == 'position' and row[column] is None:
+                continue
+            if not isinstance(row[column], str) or len(row[column]) > max_length:
+                return None, f'{column} must be a string of at most {max_length} characters'
+
+        if not row['full_name'] or not row['slack_id']:
+            return None, 'full_name and slack_id must not be empty'
+
+        if row['roles'] is not None:
+            if not isinstance(row['roles'], list) or any(type(role_id) is not int for role_id in row['roles']):
+                return None, 'roles must be a list of integers'
+            if not row['roles']:
+                return None, 'roles must not be empty'
+            row['roles'] = list(dict.fromkeys(row['roles']))
+
+        return row, None
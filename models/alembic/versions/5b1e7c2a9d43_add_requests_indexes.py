@@ -0,0 +1,40 @@
+"""add_requests_indexes
+
+Revision ID: 5b1e7c2a9d43
+Revises: 0db24312cc90
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7c2a9d43'
+down_revision = '0db24312cc90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_requests_active_id', 'requests', ['id'], postgresql_where=sa.text("status <> 'deleted'"))
+    op.create_index('ix_requests_status_id', 'requests', ['status', 'id'])
+    op.create_index('ix_requests_creator_id', 'requests', ['creator', 'id'])
+    op.create_index('ix_requests_reviewer_id', 'requests', ['reviewer', 'id'])
+    op.create_index('ix_requests_payment_date', 'requests', ['payment_date'])
+    op.create_index('ix_requests_bonus_type', 'requests', ['bonus_type'])
+    op.create_index('ix_requests_history_request_id', 'requests_history', ['request_id'])
+    op.create_index('ix_workers_roles_relations_worker_id', 'workers_roles_relations', ['worker_id'])
+    op.create_index('ix_workers_roles_relations_role_id', 'workers_roles_relations', ['role_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_workers_roles_relations_role_id', table_name='workers_roles_relations')
+    op.drop_index('ix_workers_roles_relations_worker_id', table_name='workers_roles_relations')
+    op.drop_index('ix_requests_history_request_id', table_name='requests_history')
+    op.drop_index('ix_requests_bonus_type', table_name='requests')
+    op.drop_index('ix_requests_payment_date', table_name='requests')
+    op.drop_index('ix_requests_reviewer_id', table_name='requests')
+    op.drop_index('ix_requests_creator_id', table_name='requests')
+    op.drop_index('ix_requests_status_id', table_name='requests')
+    op.drop_index('ix_requests_active_id', table_name='requests')
@@ -0,0 +1,26 @@
+"""add_requests_history_timestamp_index
+
+Revision ID: 8e3f4a6b1c27
+Revises: 5b1e7c2a9d43
+Create Date: 2026-10-18 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3f4a6b1c27'
+down_revision = '5b1e7c2a9d43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_requests_history_request_timestamp', 'requests_history', ['request_id', 'timestamp', 'id'])
+    op.drop_index('ix_requests_history_request_id', table_name='requests_history')
+
+
+def downgrade() -> None:
+    op.create_index('ix_requests_history_request_id', 'requests_history', ['request_id'])
+    op.drop_index('ix_requests_history_request_timestamp', table_name='requests_history')
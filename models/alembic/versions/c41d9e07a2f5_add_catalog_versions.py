@@ -0,0 +1,28 @@
+"""add_catalog_versions
+
+Revision ID: c41d9e07a2f5
+Revises: 8e3f4a6b1c27
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d9e07a2f5'
+down_revision = '8e3f4a6b1c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('catalog_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('catalog_versions')
@@ -0,0 +1,35 @@
+"""unique_workers_roles_relations
+
+Revision ID: e6a2b8d4f913
+Revises: c41d9e07a2f5
+Create Date: 2026-10-18 16:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a2b8d4f913'
+down_revision = 'c41d9e07a2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing duplicates would block the unique index, the oldest row of each pair is kept
+    op.execute(sa.text("""
+        DELETE FROM workers_roles_relations duplicate
+        USING workers_roles_relations original
+        WHERE duplicate.worker_id = original.worker_id
+          AND duplicate.role_id = original.role_id
+          AND duplicate.id > original.id
+    """))
+    op.create_index('ix_workers_roles_relations_worker_role', 'workers_roles_relations', ['worker_id', 'role_id'],
+                    unique=True)
+    op.drop_index('ix_workers_roles_relations_worker_id', table_name='workers_roles_relations')
+
+
+def downgrade() -> None:
+    op.create_index('ix_workers_roles_relations_worker_id', 'workers_roles_relations', ['worker_id'])
+    op.drop_index('ix_workers_roles_relations_worker_role', table_name='workers_roles_relations')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Date, func
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Date, Index, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -43,6 +43,10 @@ class Role(Base):
 
 class WorkersRolesRelation(Base):
     __tablename__ = "workers_roles_relations"
+    __table_args__ = (
+        Index('ix_workers_roles_relations_worker_role', 'worker_id', 'role_id', unique=True),
+        Index('ix_workers_roles_relations_role_id', 'role_id'),
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -78,8 +82,27 @@ class Bonus(Base):
         }
 
 
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+    def __init__(self, name, version=0):
+        self.name = name
+        self.version = version
+
+
 class Request(Base):
     __tablename__ = "requests"
+    __table_args__ = (
+        Index('ix_requests_active_id', 'id', postgresql_where="status <> 'deleted'"),
+        Index('ix_requests_status_id', 'status', 'id'),
+        Index('ix_requests_creator_id', 'creator', 'id'),
+        Index('ix_requests_reviewer_id', 'reviewer', 'id'),
+        Index('ix_requests_payment_date', 'payment_date'),
+        Index('ix_requests_bonus_type', 'bonus_type'),
+    )
 
     id = Column(Integer, primary_key=True)
     status = Column(String(20), nullable=False, default='created')
@@ -114,15 +137,18 @@ class Request(Base):
             'reviewer': self.reviewer,
             'bonus_type': self.bonus_type,
             'payment_amount': self.payment_amount,
-            'payment_date': str(self.payment_date),
+            'payment_date': self.payment_date,
             'status': self.status,
             'description': self.description,
-            'created_at': str(self.created_at)
+            'created_at': self.created_at
         }
 
 
 class RequestHistory(Base):
     __tablename__ = "requests_history"
+    __table_args__ = (
+        Index('ix_requests_history_request_timestamp', 'request_id', 'timestamp', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     changes = Column(String(300), nullable=False, default='created')
@@ -143,6 +169,6 @@ class RequestHistory(Base):
             'id': self.id,
             'changes': self.changes,
             'editor': self.editor,
-            'timestamp': str(self.timestamp),
+            'timestamp': self.timestamp,
             'request_id': self.request_id
         }
@@ -6,6 +6,7 @@ from sqlalchemy_utils import database_exists, create_database
 from dotenv import load_dotenv
 
 from models.models import Base
+from utils.cache import CACHES
 
 
 def build_test_db_url():
@@ -41,6 +42,14 @@ def connection(engine):
     connection.close()
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # In-process caches outlive a test the same way they outlive a warm invocation
+    for cache in CACHES.values():
+        cache.clear()
+        cache.reset_stats()
+
+
 @pytest.fixture(scope='module', autouse=True)
 def clear_db(connection, engine):
     Base.metadata.drop_all(bind=engine)
@@ -14,7 +14,7 @@ def test_lambda_handler_with_wrong_endpoint(bonuses_event):
     result = lambda_handler(bonuses_event, None)
 
     assert result['statusCode'] == 404
-    assert result['body'] == json.dumps({'message': 'Not found'})
+    assert json.loads(result['body']) == {'message': 'Not found'}
 
 
 @pytest.mark.parametrize('bonus', deepcopy(test_bonuses_data_with_id))
@@ -48,7 +48,7 @@ def test_lambda_handler_get_request(bonuses_event):
     result = lambda_handler(bonuses_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(test_bonuses_data_with_id)
+    assert json.loads(result['body']) == test_bonuses_data_with_id
 
 
 @pytest.mark.parametrize('bonus_index', [0, 1, 2, 3])
@@ -59,7 +59,7 @@ def test_lambda_handler_get_by_id_request(bonus_index, bonuses_event):
     result = lambda_handler(bonuses_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(test_bonuses_data_with_id[bonus_index])
+    assert json.loads(result['body']) == test_bonuses_data_with_id[bonus_index]
 
 
 @pytest.mark.parametrize('bonus_index', [4, 5, 6, 7])
@@ -99,17 +99,18 @@ def test_lambda_handler_patch_request(existing_bonus, new_data, bonuses_event):
         assert body[key] == new_data[key]
 
 
-@pytest.mark.parametrize('existing_bonus,new_data',
-                         [({'id': 59}, {'type': 'new_year'}),
-                          (test_bonuses_data_with_id[1], {'type': 'new_year'})])
+@pytest.mark.parametrize('existing_bonus,new_data,status_code',
+                         [({'id': 59}, {'type': 'new_year'}, 404),
+                          (test_bonuses_data_with_id[1], {'type': 'new_year'}, 400),
+                          (test_bonuses_data_with_id[1], {'id': 100}, 400)])
 @pytest.mark.parametrize('bonuses_event', (('/bonuses/{id}', 'PATCH', {}),), indirect=True)
-def test_lambda_handler_patch_request_with_wrong_data(existing_bonus, new_data, bonuses_event):
+def test_lambda_handler_patch_request_with_wrong_data(existing_bonus, new_data, status_code, bonuses_event):
     bonuses_event['pathParameters'] = {'id': existing_bonus['id']}
     bonuses_event['body'] = json.dumps(new_data)
 
     result = lambda_handler(bonuses_event, None)
 
-    assert result['statusCode'] == 400
+    assert result['statusCode'] == status_code
 
 
 @pytest.mark.parametrize('bonus_index', [0, 1, 2, 3])
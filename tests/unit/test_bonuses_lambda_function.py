@@ -22,29 +22,63 @@ def bonuses_event(request):
 def test_get_bonuses_with_empty_bonuses_list(mocker):
     mocker.patch('lambda_bonuses.lambda_function.BonusesQuery.get_bonuses', return_value=[])
 
-    result = get_bonuses()
+    result = get_bonuses({'queryStringParameters': None})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([])
+    assert json.loads(result['body']) == []
 
 
 def test_get_bonuses_with_not_empty_bonuses_list(mocker, simple_bonus):
     mocker.patch('lambda_bonuses.lambda_function.BonusesQuery.get_bonuses',
                  return_value=[simple_bonus])
 
-    result = get_bonuses()
+    result = get_bonuses({'queryStringParameters': None})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_bonus])
+    assert json.loads(result['body']) == [simple_bonus]
 
 
 def test_get_bonuses_when_error_occur(mocker):
     mocker.patch('lambda_bonuses.lambda_function.BonusesQuery.get_bonuses', return_value=0)
 
-    result = get_bonuses()
+    result = get_bonuses({'queryStringParameters': None})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_get_bonuses_with_ids(mocker, simple_bonus):
+    get_bonuses_mock = mocker.patch('lambda_bonuses.lambda_function.BonusesQuery.get_bonuses',
+                                    return_value=[simple_bonus])
+
+    result = get_bonuses({'queryStringParameters': {'ids': '1,2'}})
+
+    assert result['statusCode'] == 200
+    get_bonuses_mock.assert_called_once_with(bonus_ids=[1, 2], fields=None)
+
+
+def test_get_bonuses_with_wrong_ids():
+    result = get_bonuses({'queryStringParameters': {'ids': '1,two'}})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_get_bonuses_with_fields(mocker):
+    get_bonuses_mock = mocker.patch('lambda_bonuses.lambda_function.BonusesQuery.get_bonuses',
+                                    return_value=[{'id': 1, 'type': 'New Year'}])
+
+    result = get_bonuses({'queryStringParameters': {'fields': 'type'}})
+
+    assert result['statusCode'] == 200
+    get_bonuses_mock.assert_called_once_with(bonus_ids=None, fields=['id', 'type'])
+
+
+def test_get_bonuses_with_wrong_fields():
+    result = get_bonuses({'queryStringParameters': {'fields': 'amount'}})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_get_bonus_by_id_when_bonus_exists(mocker, simple_bonus):
@@ -54,7 +88,7 @@ def test_get_bonus_by_id_when_bonus_exists(mocker, simple_bonus):
     result = get_bonus_by_id(1)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_bonus)
+    assert json.loads(result['body']) == simple_bonus
 
 
 def test_get_bonus_by_id_when_bonus_not_exists(mocker):
@@ -63,7 +97,7 @@ def test_get_bonus_by_id_when_bonus_not_exists(mocker):
     result = get_bonus_by_id(1)
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_create_bonus(mocker, simple_bonus):
@@ -72,7 +106,7 @@ def test_create_bonus(mocker, simple_bonus):
     result = create_bonus({'body': json.dumps(simple_bonus)})
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_bonus)
+    assert json.loads(result['body']) == simple_bonus
 
 
 def test_create_bonus_when_error_occur(mocker, simple_bonus):
@@ -81,7 +115,7 @@ def test_create_bonus_when_error_occur(mocker, simple_bonus):
     result = create_bonus({'body': json.dumps(simple_bonus)})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_update_bonus(mocker, simple_bonus):
@@ -90,7 +124,7 @@ def test_update_bonus(mocker, simple_bonus):
     result = update_bonus(1, {'body': json.dumps({'type': 'Overtime'})})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_bonus)
+    assert json.loads(result['body']) == simple_bonus
 
 
 def test_update_bonus_when_error_occur(mocker):
@@ -99,7 +133,16 @@ def test_update_bonus_when_error_occur(mocker):
     result = update_bonus(1, {'body': json.dumps({'type': 'Overtime'})})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_update_bonus_with_not_existing_id(mocker):
+    mocker.patch('lambda_bonuses.lambda_function.BonusesQuery.update_bonus', return_value=None)
+
+    result = update_bonus(1, {'body': json.dumps({'type': 'Overtime'})})
+
+    assert result['statusCode'] == 404
+    assert json.loads(result['body']) == {'message': 'Not found'}
 
 
 def test_delete_bonus(mocker):
@@ -117,14 +160,14 @@ def test_delete_bonus_when_error_occur(mocker):
     result = delete_bonus(1)
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_lambda_handler_with_wrong_endpoint():
     result = lambda_handler({'resource': '/wrong'}, None)
 
     assert result['statusCode'] == 404
-    assert result['body'] == json.dumps({'message': 'Not found'})
+    assert json.loads(result['body']) == {'message': 'Not found'}
 
 
 @pytest.mark.parametrize('bonuses_event', (('/bonuses', 'GET', {}),), indirect=True)
@@ -135,7 +178,19 @@ def test_lambda_handler_get_all_bonuses(mocker, simple_bonus, bonuses_event):
     result = lambda_handler(bonuses_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_bonus])
+    assert json.loads(result['body']) == [simple_bonus]
+
+
+@pytest.mark.parametrize('bonuses_event', (('/bonuses', 'GET', {}),), indirect=True)
+def test_lambda_handler_get_all_bonuses_not_modified(mocker, simple_bonus, bonuses_event):
+    mocker.patch('lambda_bonuses.lambda_function.BonusesQuery.get_bonuses', return_value=[simple_bonus])
+
+    result_1 = lambda_handler(bonuses_event, None)
+    bonuses_event['headers'] = {'If-None-Match': result_1['headers']['ETag']}
+    result_2 = lambda_handler(bonuses_event, None)
+
+    assert result_1['statusCode'] == 200
+    assert result_2 == {'statusCode': 304, 'headers': {'ETag': result_1['headers']['ETag']}}
 
 
 @pytest.mark.parametrize('bonuses_event', (('/bonuses', 'POST', {}),), indirect=True)
@@ -146,7 +201,7 @@ def test_lambda_handler_create_bonus(mocker, simple_bonus, bonuses_event):
     result = lambda_handler(bonuses_event, None)
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_bonus)
+    assert json.loads(result['body']) == simple_bonus
 
 
 @pytest.mark.parametrize('bonuses_event', (('/bonuses/{id}', 'GET', {'id': 1}),), indirect=True)
@@ -156,7 +211,7 @@ def test_lambda_handler_get_bonus_by_id(mocker, simple_bonus, bonuses_event):
     result = lambda_handler(bonuses_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_bonus)
+    assert json.loads(result['body']) == simple_bonus
 
 
 @pytest.mark.parametrize('bonuses_event', (('/bonuses/{id}', 'PATCH', {'id': 1}),), indirect=True)
@@ -167,7 +222,7 @@ def test_lambda_handler_update_bonus(mocker, simple_bonus, bonuses_event):
     result = lambda_handler(bonuses_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_bonus)
+    assert json.loads(result['body']) == simple_bonus
 
 
 @pytest.mark.parametrize('bonuses_event', (('/bonuses/{id}', 'DELETE', {'id': 1}),), indirect=True)
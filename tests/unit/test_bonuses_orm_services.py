@@ -1,7 +1,8 @@
 import pytest
+from sqlalchemy.exc import SQLAlchemyError
 
-from lambda_bonuses.orm_services import BonusesQuery
-from models.models import Bonus
+from lambda_bonuses.orm_services import BonusesQuery, BONUS_CATALOG
+from models.models import Bonus, CatalogVersion
 
 test_bonuses_data = [
     {'type': 'New Year', 'description': 'New Year bonus'},
@@ -37,6 +38,24 @@ def test_get_bonuses_query_with_not_empty_db(mocker, session, fill_bonuses_db):
     assert len(result) == len(test_bonuses_data)
 
 
+def test_get_bonuses_query_with_ids(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+
+    result = BonusesQuery.get_bonuses(bonus_ids=[3, 1, 10])
+
+    assert [bonus['id'] for bonus in result] == [1, 3]
+
+
+def test_get_bonuses_query_with_fields(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+
+    result_1 = BonusesQuery.get_bonuses(fields=['id', 'type'])
+    result_2 = BonusesQuery.get_bonuses()
+
+    assert result_1[0] == {'id': 1, 'type': 'New Year'}
+    assert result_2[0] == {'id': 1, 'type': 'New Year', 'description': 'New Year bonus'}
+
+
 def test_get_bonus_by_id_query_with_existing_bonus(mocker, session, fill_bonuses_db):
     mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
 
@@ -131,3 +150,104 @@ def test_update_bonus_query_with_not_correct_data(mocker, session, fill_bonuses_
 
     assert result == 0
 
+
+
+def test_update_bonus_query_with_not_existing_bonus(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+    bonus_data = {'type': 'Overtime'}
+
+    result = BonusesQuery.update_bonus(10, bonus_data)
+
+    assert result is None
+
+
+@pytest.mark.parametrize('bonus_data', [{}, {'id': 10}, {'type': 'Overtime', 'amount': 100}])
+def test_update_bonus_query_with_not_updatable_columns(mocker, session, fill_bonuses_db, bonus_data):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+
+    result = BonusesQuery.update_bonus(1, bonus_data)
+
+    assert result == 0
+
+
+def test_get_bonuses_query_serves_catalog_from_memory(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+    load_catalog_spy = mocker.spy(BonusesQuery, '_load_catalog')
+
+    result_1 = BonusesQuery.get_bonuses()
+    result_2 = BonusesQuery.get_bonuses()
+    result_3 = BonusesQuery.get_bonus_by_id('2')
+
+    assert result_1 == result_2
+    assert result_3['id'] == 2
+    assert load_catalog_spy.call_count == 1
+    assert BONUS_CATALOG.stats['version_checks'] == 1
+
+
+def test_get_bonuses_query_reloads_catalog_when_version_changes(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+    mocker.patch.object(BONUS_CATALOG, 'freshness', 0)
+    BonusesQuery.get_bonuses()
+
+    # A write made by another container: new row and bumped version, nothing cleared locally
+    session.add(Bonus('Overtime'))
+    BonusesQuery._bump_catalog_version(session)
+    session.commit()
+    result_1 = BonusesQuery.get_bonuses()
+    result_2 = BonusesQuery.get_bonuses()
+
+    assert len(result_1) == len(test_bonuses_data) + 1
+    assert result_2 == result_1
+    assert BONUS_CATALOG.stats == {'hits': 1, 'misses': 2, 'version_checks': 3}
+
+
+def test_get_bonuses_query_with_read_your_writes_skips_catalog(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+
+    BonusesQuery.get_bonuses(read_your_writes=True)
+
+    assert len(BONUS_CATALOG) == 0
+
+
+def test_get_bonuses_query_when_error_occur(mocker, session):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+    mocker.patch('lambda_bonuses.orm_services.BonusesQuery._get_catalog_version', side_effect=SQLAlchemyError())
+
+    result = BonusesQuery.get_bonuses()
+
+    assert result == 0
+
+
+@pytest.mark.parametrize('write', [
+    lambda: BonusesQuery.add_new_bonus({'type': 'Overtime'}),
+    lambda: BonusesQuery.update_bonus(1, {'description': 'Updated'}),
+    lambda: BonusesQuery.delete_bonus(4)
+])
+def test_bonus_writes_bump_catalog_version(mocker, session, fill_bonuses_db, write):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+    BonusesQuery.get_bonuses()
+
+    write()
+    write_version = BonusesQuery._get_catalog_version(session)
+
+    assert write_version == 1
+    assert len(BONUS_CATALOG) == 0
+    assert session.query(CatalogVersion).count() == 1
+
+
+def test_delete_bonus_query_without_bonus_keeps_catalog_version(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+
+    result = BonusesQuery.delete_bonus(10)
+
+    assert result == 0
+    assert BonusesQuery._get_catalog_version(session) == 0
+
+
+def test_bonus_failed_write_keeps_catalog_version(mocker, session, fill_bonuses_db):
+    mocker.patch('lambda_bonuses.orm_services.open_db_session', return_value=session)
+    BonusesQuery.add_new_bonus({'type': 'Overtime'})
+
+    BonusesQuery.add_new_bonus({'type': 'Overtime'})
+
+    assert BonusesQuery._get_catalog_version(session) == 1
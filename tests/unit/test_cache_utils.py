@@ -0,0 +1,111 @@
+import pytest
+
+import utils.cache
+from utils.cache import TTLCache, VersionedCache, CACHES, get_cache_stats
+
+
+@pytest.fixture()
+def cache(mocker):
+    mocker.patch.dict(CACHES, clear=True)
+
+    return TTLCache('test', maxsize=2, ttl=10)
+
+
+def test_cache_get_and_set(cache):
+    missing = cache.get('a')
+    cache.set('a', 1)
+
+    assert missing is None
+    assert cache.get('a') == 1
+    assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0}
+
+
+def test_cache_entry_expires_after_ttl(mocker, cache):
+    monotonic_mock = mocker.patch.object(utils.cache.time, 'monotonic', return_value=100)
+    cache.set('a', 1)
+
+    monotonic_mock.return_value = 109
+    fresh = cache.get('a')
+    monotonic_mock.return_value = 110
+    expired = cache.get('a')
+
+    assert fresh == 1
+    assert expired is None
+    assert len(cache) == 0
+
+
+def test_cache_evicts_least_recently_used(cache):
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats['evictions'] == 1
+
+
+def test_cache_clear_and_reset_stats(cache):
+    cache.set('a', 1)
+    cache.get('a')
+
+    cache.clear()
+    cache.reset_stats()
+
+    assert len(cache) == 0
+    assert cache.stats == {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def test_get_cache_stats(cache):
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('b')
+
+    assert get_cache_stats() == {'test': {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}}
+
+
+def test_versioned_cache_within_freshness_window(mocker):
+    mocker.patch.dict(CACHES, clear=True)
+    monotonic_mock = mocker.patch.object(utils.cache.time, 'monotonic', return_value=100)
+    load_version, load_value = mocker.Mock(return_value=1), mocker.Mock(return_value=['a'])
+    cache = VersionedCache('test', freshness=5)
+
+    result_1 = cache.get(load_version, load_value)
+    monotonic_mock.return_value = 104
+    result_2 = cache.get(load_version, load_value)
+
+    assert result_1 == result_2 == ['a']
+    assert load_version.call_count == 1
+    assert load_value.call_count == 1
+    assert cache.stats == {'hits': 1, 'misses': 1, 'version_checks': 1}
+
+
+@pytest.mark.parametrize('new_version,loads', [(1, 1), (2, 2)])
+def test_versioned_cache_after_freshness_window(mocker, new_version, loads):
+    mocker.patch.dict(CACHES, clear=True)
+    monotonic_mock = mocker.patch.object(utils.cache.time, 'monotonic', return_value=100)
+    load_version, load_value = mocker.Mock(return_value=1), mocker.Mock(return_value=['a'])
+    cache = VersionedCache('test', freshness=5)
+
+    cache.get(load_version, load_value)
+    monotonic_mock.return_value = 105
+    load_version.return_value = new_version
+    cache.get(load_version, load_value)
+
+    assert load_version.call_count == 2
+    assert load_value.call_count == loads
+    assert cache.version == new_version
+
+
+def test_versioned_cache_clear(mocker):
+    mocker.patch.dict(CACHES, clear=True)
+    cache = VersionedCache('test', freshness=5)
+    cache.get(lambda: 1, lambda: ['a'])
+
+    cache.clear()
+    cache.reset_stats()
+
+    assert len(cache) == 0
+    assert cache.version is None
+    assert get_cache_stats() == {'test': {'hits': 0, 'misses': 0, 'version_checks': 0, 'size': 0}}
@@ -1,6 +1,15 @@
+import base64
+import copy
+import gzip
 import json
+import pickle
+import pytest
+from datetime import date, datetime
 
-from utils.http import http_ok, http_created
+from utils.http import http_ok, http_ok_encoded, http_created, parse_id_list, parse_fields, MAX_IDS, JSON_ENCODERS, \
+    HTTP_BAD_REQUEST, HTTP_NO_CONTENT, get_json_encoder, encode_json, COMPRESSORS, get_header, choose_encoding, \
+    compress_response, with_compression, http_not_modified, build_etag, content_etag, etag_matches, \
+    with_conditional_get
 
 
 def test_http_ok():
@@ -11,9 +20,256 @@ def test_http_ok():
     assert result['headers']['Content-Type'] == 'application/json'
 
 
+@pytest.mark.parametrize('encoder_name', JSON_ENCODERS)
+def test_json_encoders(encoder_name):
+    data = {'id': 1, 'payment_date': date(2022, 9, 14), 'created_at': datetime(2022, 9, 14, 10, 30, 0, 5),
+            'roles': ['worker'], 'description': 'Премія'}
+
+    result = JSON_ENCODERS[encoder_name](data)
+
+    assert type(result) is str
+    assert result == '{"id":1,"payment_date":"2022-09-14","created_at":"2022-09-14T10:30:00.000005",' \
+                     '"roles":["worker"],"description":"Премія"}'
+
+
+@pytest.mark.parametrize('encoder_name', JSON_ENCODERS)
+def test_json_encoders_with_unsupported_type(encoder_name):
+    with pytest.raises(TypeError):
+        JSON_ENCODERS[encoder_name]({'value': object()})
+
+
+def test_get_json_encoder(monkeypatch):
+    monkeypatch.delenv('JSON_ENCODER', raising=False)
+    default_encoder = get_json_encoder()
+
+    monkeypatch.setenv('JSON_ENCODER', 'stdlib')
+    stdlib_encoder = get_json_encoder()
+
+    assert default_encoder is encode_json
+    assert default_encoder is JSON_ENCODERS.get('orjson', JSON_ENCODERS['stdlib'])
+    assert stdlib_encoder is JSON_ENCODERS['stdlib']
+
+
+def test_get_json_encoder_with_unknown_name(monkeypatch):
+    monkeypatch.setenv('JSON_ENCODER', 'simplejson')
+
+    with pytest.raises(ValueError):
+        get_json_encoder()
+
+
+@pytest.mark.parametrize('change', [
+    lambda response: response.update(statusCode=200),
+    lambda response: response.__setitem__('body', '{}'),
+    lambda response: response.pop('body'),
+    lambda response: response['headers'].__setitem__('ETag', '"1"'),
+    lambda response: response['headers'].clear()
+])
+def test_static_responses_are_immutable(change):
+    with pytest.raises(TypeError):
+        change(HTTP_BAD_REQUEST)
+
+    assert HTTP_BAD_REQUEST == {'statusCode': 400, 'headers': {'Content-Type': 'application/json'},
+                                'body': '{"message":"Bad Request"}'}
+
+
+def test_static_responses_copies_are_mutable():
+    response = {**HTTP_NO_CONTENT, 'headers': {**HTTP_NO_CONTENT['headers'], 'ETag': '"1"'}}
+
+    assert response == {'statusCode': 204, 'headers': {'Content-Type': 'application/json', 'ETag': '"1"'}}
+    assert 'ETag' not in HTTP_NO_CONTENT['headers']
+
+
+@pytest.mark.parametrize('make_copy', [lambda response: response.copy(), copy.copy, copy.deepcopy,
+                                       lambda response: pickle.loads(pickle.dumps(response))])
+def test_static_responses_copies_are_plain_dicts(make_copy):
+    response = make_copy(HTTP_BAD_REQUEST)
+    response['headers']['ETag'] = '"1"'
+    response['statusCode'] = 200
+
+    assert type(response) is dict and type(response['headers']) is dict
+    assert response['body'] == HTTP_BAD_REQUEST['body']
+    assert 'ETag' not in HTTP_BAD_REQUEST['headers']
+    assert HTTP_BAD_REQUEST['statusCode'] == 400
+
+
+def test_http_ok_encoded():
+    result = http_ok_encoded('[{"id": 1}]')
+
+    assert result['statusCode'] == 200
+    assert result['body'] == '[{"id": 1}]'
+    assert result['headers']['Content-Type'] == 'application/json'
+
+
 def test_http_created():
     result = http_created({})
 
     assert result['statusCode'] == 201
     assert result['body'] == json.dumps({})
-    assert result['headers']['Content-Type'] == 'application/json'
\ No newline at end of file
+    assert result['headers']['Content-Type'] == 'application/json'
+
+
+@pytest.mark.parametrize('value,expected', [('1', [1]), ('1,2,3', [1, 2, 3]), ('4, 5,', [4, 5])])
+def test_parse_id_list(value, expected):
+    assert parse_id_list(value) == expected
+
+
+def test_parse_id_list_with_str_items():
+    assert parse_id_list('EF4ED73Q12X, V11ED730DDR', item_type=str) == ['EF4ED73Q12X', 'V11ED730DDR']
+
+
+@pytest.mark.parametrize('value', ['', ',', '1,two', ','.join(map(str, range(MAX_IDS + 1)))])
+def test_parse_id_list_with_wrong_value(value):
+    with pytest.raises(ValueError):
+        parse_id_list(value)
+
+
+@pytest.mark.parametrize('value,expected', [('status', ['id', 'status']), ('status, id,status', ['id', 'status']),
+                                            ('id', ['id'])])
+def test_parse_fields(value, expected):
+    assert parse_fields(value, ('id', 'status', 'description')) == expected
+
+
+@pytest.mark.parametrize('value', ['', ',', 'status,password'])
+def test_parse_fields_with_wrong_value(value):
+    with pytest.raises(ValueError):
+        parse_fields(value, ('id', 'status', 'description'))
+
+
+@pytest.mark.parametrize('headers,expected', [({'Accept-Encoding': 'gzip'}, 'gzip'),
+                                              ({'accept-encoding': 'gzip'}, 'gzip'), ({}, None)])
+def test_get_header(headers, expected):
+    assert get_header({'headers': headers}, 'Accept-Encoding') == expected
+
+
+def test_get_header_without_headers():
+    assert get_header({'headers': None}, 'Accept-Encoding') is None
+
+
+@pytest.mark.parametrize('accept_encoding,expected', [
+    (None, None), ('', None), ('identity', None), ('gzip', 'gzip'), ('GZIP', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'), ('gzip;q=0', None), ('gzip;q=abc', None), ('*', next(iter(COMPRESSORS))),
+    ('*, gzip;q=0', next(iter(COMPRESSORS)) if 'br' in COMPRESSORS else None)
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_compress_response():
+    data = [{'id': n, 'status': 'created'} for n in range(100)]
+
+    result = compress_response(http_ok(data), 'gzip', min_size=100)
+
+    assert result['isBase64Encoded'] is True
+    assert result['headers'] == {'Content-Type': 'application/json', 'Content-Encoding': 'gzip',
+                                 'Vary': 'Accept-Encoding'}
+    assert json.loads(gzip.decompress(base64.b64decode(result['body']))) == data
+
+
+def test_compress_response_without_accepted_encoding():
+    response = http_ok([{'id': n} for n in range(100)])
+
+    result = compress_response(response, 'identity', min_size=100)
+
+    assert result['body'] == response['body']
+    assert result['headers'] == {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+    assert 'isBase64Encoded' not in result
+
+
+@pytest.mark.parametrize('response', [http_ok([{'id': 1}]), HTTP_NO_CONTENT,
+                                      {**http_ok_encoded('eyJpZCI6IDF9'), 'isBase64Encoded': True}])
+def test_compress_response_when_not_compressed(response):
+    assert compress_response(response, 'gzip', min_size=100) is response
+
+
+def test_with_compression():
+    data = [{'id': n, 'description': 'Премія'} for n in range(1000)]
+    body = json.dumps({'description': 'Премія'})
+    event = {'headers': {'accept-encoding': 'gzip, deflate'}, 'isBase64Encoded': True,
+             'body': base64.b64encode(body.encode()).decode()}
+    events = []
+
+    def handler(handler_event, context):
+        events.append(handler_event)
+        return http_ok(data)
+
+    result = with_compression(handler)(event, None)
+
+    assert events[0]['body'] == body
+    assert events[0]['isBase64Encoded'] is False
+    assert result['headers']['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(base64.b64decode(result['body']))) == data
+
+
+def test_http_ok_with_etag():
+    result = http_ok({}, 'W/"1"')
+
+    assert result['headers'] == {'Content-Type': 'application/json', 'ETag': 'W/"1"'}
+
+
+def test_http_not_modified():
+    result = http_not_modified('W/"1"')
+
+    assert result == {'statusCode': 304, 'headers': {'ETag': 'W/"1"'}}
+
+
+def test_build_etag():
+    etag = build_etag([1, 2], {'status': 'created', 'fields': 'id'})
+
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == build_etag([1, 2], {'fields': 'id', 'status': 'created'})
+    assert etag != build_etag([1, 3], {'fields': 'id', 'status': 'created'})
+    assert etag != build_etag([1, 2], {'fields': 'id'})
+    assert build_etag([1], None) == build_etag([1], {})
+
+
+def test_content_etag():
+    assert content_etag('[]') == content_etag('[]')
+    assert content_etag('[]') != content_etag('[{}]')
+
+
+@pytest.mark.parametrize('if_none_match,expected', [
+    (None, False), ('', False), ('W/"abc"', True), ('"abc"', True), ('"xyz", W/"abc"', True), ('*', True),
+    ('"xyz"', False), ('W/"ab"', False)
+])
+def test_etag_matches(if_none_match, expected):
+    event = {'headers': {'If-None-Match': if_none_match}}
+
+    assert etag_matches(event, 'W/"abc"') is expected
+
+
+def test_etag_matches_without_etag():
+    assert etag_matches({'headers': {'If-None-Match': '*'}}, None) is False
+
+
+def test_with_conditional_get():
+    handler = with_conditional_get(lambda event, context: http_ok([{'id': 1}]))
+    etag = content_etag(encode_json([{'id': 1}]))
+
+    result_1 = handler({'httpMethod': 'GET', 'headers': None}, None)
+    result_2 = handler({'httpMethod': 'GET', 'headers': {'if-none-match': etag}}, None)
+    result_3 = handler({'httpMethod': 'GET', 'headers': {'if-none-match': 'W/"old"'}}, None)
+
+    assert result_1['headers']['ETag'] == etag
+    assert json.loads(result_1['body']) == [{'id': 1}]
+    assert result_2 == {'statusCode': 304, 'headers': {'ETag': etag}}
+    assert result_3 == result_1
+
+
+def test_with_conditional_get_keeps_handler_etag():
+    handler = with_conditional_get(lambda event, context: http_ok([{'id': 1}], 'W/"v1"'))
+
+    result_1 = handler({'httpMethod': 'GET', 'headers': {}}, None)
+    result_2 = handler({'httpMethod': 'GET', 'headers': {'If-None-Match': 'W/"v1"'}}, None)
+
+    assert result_1['headers']['ETag'] == 'W/"v1"'
+    assert result_2['statusCode'] == 304
+
+
+@pytest.mark.parametrize('method,response', [('POST', http_created({})), ('GET', HTTP_BAD_REQUEST),
+                                             ('GET', HTTP_NO_CONTENT)])
+def test_with_conditional_get_when_not_applicable(method, response):
+    handler = with_conditional_get(lambda event, context: response)
+
+    result = handler({'httpMethod': method, 'headers': {'If-None-Match': '*'}}, None)
+
+    assert result is response
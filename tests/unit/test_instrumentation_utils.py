@@ -0,0 +1,113 @@
+import json
+import os
+import pytest
+
+import utils.instrumentation
+from utils.database import create_db_engine
+from utils.http import http_ok
+from utils.instrumentation import log_invocation, record_query, reset_invocation_stats, is_instrumentation_enabled, \
+    INVOCATION_STATS
+
+
+@pytest.fixture()
+def instrumentation_enabled(mocker):
+    mocker.patch.dict(os.environ, {'DB_INSTRUMENTATION': 'true'})
+    reset_invocation_stats()
+
+
+@pytest.fixture()
+def instrumentation_disabled(mocker):
+    mocker.patch.dict(os.environ, {'DB_INSTRUMENTATION': ''})
+    reset_invocation_stats()
+
+
+@pytest.mark.parametrize('value,expected', [('1', True), ('true', True), ('Yes', True), ('', False), ('0', False)])
+def test_is_instrumentation_enabled(mocker, value, expected):
+    mocker.patch.dict(os.environ, {'DB_INSTRUMENTATION': value})
+
+    assert is_instrumentation_enabled() is expected
+
+
+def test_record_query(instrumentation_enabled):
+    record_query('SELECT 1', 0.002)
+    record_query('SELECT 2', 0.005)
+    record_query('SELECT 3', 0.001)
+
+    assert INVOCATION_STATS['queries'] == 3
+    assert INVOCATION_STATS['db_time'] == pytest.approx(0.008)
+    assert INVOCATION_STATS['slowest_time'] == 0.005
+    assert INVOCATION_STATS['slowest_statement'] == 'SELECT 2'
+
+
+def test_query_stats_with_instrumentation_enabled(mocker, engine, instrumentation_enabled):
+    mocker.patch('utils.database.build_db_url', return_value=str(engine.url))
+
+    db_engine = create_db_engine()
+    with db_engine.connect() as connection:
+        connection.execute('SELECT 1')
+        connection.execute('SELECT pg_sleep(0.01)')
+    db_engine.dispose()
+
+    assert INVOCATION_STATS['queries'] >= 2
+    assert INVOCATION_STATS['db_time'] >= 0.01
+    assert INVOCATION_STATS['slowest_statement'] == 'SELECT pg_sleep(0.01)'
+
+
+def test_query_stats_with_instrumentation_disabled(mocker, engine, instrumentation_disabled):
+    mocker.patch('utils.database.build_db_url', return_value=str(engine.url))
+
+    db_engine = create_db_engine()
+    with db_engine.connect() as connection:
+        connection.execute('SELECT 1')
+    db_engine.dispose()
+
+    assert INVOCATION_STATS['queries'] == 0
+    assert INVOCATION_STATS['db_time'] == 0
+
+
+def test_serialization_time_with_instrumentation_enabled(instrumentation_enabled):
+    http_ok([{'id': i} for i in range(1000)])
+
+    assert INVOCATION_STATS['serialization_time'] > 0
+
+
+def test_log_invocation_with_instrumentation_enabled(mocker, capsys, instrumentation_enabled):
+    mocker.patch.object(utils.instrumentation, '_cold_start', True)
+
+    @log_invocation
+    def handler(event, context):
+        record_query('SELECT 1', 0.003)
+        return http_ok({})
+
+    handler({'resource': '/workers', 'httpMethod': 'GET'}, None)
+    handler({'resource': '/workers', 'httpMethod': 'GET'}, None)
+
+    logs = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert len(logs) == 2
+    assert logs[0]['route'] == '/workers'
+    assert logs[0]['method'] == 'GET'
+    assert logs[0]['status_code'] == 200
+    assert logs[0]['queries'] == 1
+    assert logs[0]['db_time_ms'] == 3
+    assert logs[0]['slowest_statement'] == 'SELECT 1'
+    assert logs[0]['cold_start'] is True
+    assert logs[1]['cold_start'] is False
+    assert logs[1]['queries'] == 1
+    assert type(logs[0]['caches']) is dict
+    assert set(logs[0]['pool']) == {'connects', 'checkouts', 'checkins', 'overflow', 'wait_time', 'engines',
+                                    'checked_out'}
+
+
+def test_log_invocation_with_instrumentation_disabled(mocker, capsys, instrumentation_disabled):
+    mocker.patch.object(utils.instrumentation, '_cold_start', True)
+
+    @log_invocation
+    def handler(event, context):
+        return http_ok({})
+
+    result = handler({'resource': '/workers', 'httpMethod': 'GET'}, None)
+
+    assert result['statusCode'] == 200
+    assert capsys.readouterr().out == ''
+    assert utils.instrumentation._cold_start is False
@@ -0,0 +1,30 @@
+import pytest
+
+from utils.pagination import encode_cursor, decode_cursor, parse_limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+
+def test_encode_and_decode_cursor():
+    cursor = encode_cursor({'id': 125})
+
+    result = decode_cursor(cursor)
+
+    assert type(cursor) is str
+    assert '=' not in cursor
+    assert result == {'id': 125}
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', '!!!', encode_cursor([1, 2]), 'eyJpZCI6'])
+def test_decode_cursor_with_wrong_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('limit,expected', [(None, DEFAULT_PAGE_SIZE), ('1', 1), ('20', 20), (MAX_PAGE_SIZE, MAX_PAGE_SIZE)])
+def test_parse_limit(limit, expected):
+    assert parse_limit(limit) == expected
+
+
+@pytest.mark.parametrize('limit', ['0', '-5', str(MAX_PAGE_SIZE + 1), 'ten'])
+def test_parse_limit_with_wrong_limit(limit):
+    with pytest.raises(ValueError):
+        parse_limit(limit)
@@ -3,6 +3,11 @@ import pytest
 from lambda_requests.lambda_function import *
 
 
+@pytest.fixture(autouse=True)
+def requests_version(mocker):
+    return mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_version', return_value=[1, 1, 1])
+
+
 @pytest.fixture
 def simple_request():
     return {
@@ -41,48 +46,126 @@ def requests_event(request):
 
 
 def test_get_requests_with_empty_requests_list(mocker):
-    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests', return_value=[])
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json', return_value=json.dumps([]))
 
     result = get_requests({'queryStringParameters': {}})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([])
+    assert json.loads(result['body']) == []
 
 
 def test_get_requests_with_not_empty_requests_list(mocker, simple_request):
-    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests', return_value=[simple_request])
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json',
+                 return_value=json.dumps([simple_request]))
 
     result = get_requests({'queryStringParameters': {}})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_request])
+    assert json.loads(result['body']) == [simple_request]
 
 
 def test_get_requests_with_query_params(mocker):
-    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests', return_value=[])
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json', return_value=json.dumps([]))
 
     result = get_requests({'queryStringParameters': {'status': 'delete'}})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([])
+    assert json.loads(result['body']) == []
 
 
 def test_get_requests_with_wrong_query_params(mocker):
-    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests', return_value=0, side_effect=KeyError())
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json', return_value=0, side_effect=KeyError())
 
     result = get_requests({'queryStringParameters': {'sts': 'delete'}})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+@pytest.mark.parametrize('query_params', [{'read_your_writes': '1'}, {'after_id': '10'}, {'request_ids': '1'},
+                                          {'limit': '1', 'read_your_writes': '1'}])
+def test_get_requests_with_internal_query_params(mocker, query_params):
+    get_requests_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json')
+    get_page_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_page')
+
+    result = get_requests({'queryStringParameters': query_params})
+
+    assert result['statusCode'] == 400
+    get_requests_mock.assert_not_called()
+    get_page_mock.assert_not_called()
 
 
 def test_get_requests_when_error_occur(mocker):
-    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests', return_value=0)
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json', return_value=0)
 
     result = get_requests({'queryStringParameters': {}})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_get_requests_with_ids(mocker, simple_request):
+    get_requests_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json',
+                                     return_value=json.dumps([simple_request]))
+
+    result = get_requests({'queryStringParameters': {'ids': '1,2', 'status': 'created'}})
+
+    assert result['statusCode'] == 200
+    get_requests_mock.assert_called_once_with(status='created', request_ids=[1, 2])
+
+
+@pytest.mark.parametrize('ids', ['', 'one', ','.join(map(str, range(MAX_IDS + 1)))])
+def test_get_requests_with_wrong_ids(ids):
+    result = get_requests({'queryStringParameters': {'ids': ids}})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_get_requests_with_fields(mocker):
+    get_requests_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json',
+                                     return_value=json.dumps([{'id': 1, 'status': 'created'}]))
+
+    result = get_requests({'queryStringParameters': {'fields': 'status'}})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == [{'id': 1, 'status': 'created'}]
+    get_requests_mock.assert_called_once_with(fields=['id', 'status'])
+
+
+def test_get_requests_with_wrong_fields():
+    result = get_requests({'queryStringParameters': {'fields': 'status,password'}})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_get_requests_with_pagination(mocker, simple_request):
+    page = {'items': [simple_request], 'next_cursor': 'eyJpZCI6MX0'}
+    get_page_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_page', return_value=page)
+
+    result = get_requests({'queryStringParameters': {'limit': '1', 'cursor': 'eyJpZCI6MH0', 'status': 'created'}})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == page
+    get_page_mock.assert_called_once_with(1, 'eyJpZCI6MH0', status='created')
+
+
+@pytest.mark.parametrize('query_params', [{'limit': 'ten'}, {'limit': '0'}, {'cursor': 'wrong'}])
+def test_get_requests_with_wrong_pagination_params(query_params):
+    result = get_requests({'queryStringParameters': query_params})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_get_requests_with_pagination_when_error_occur(mocker):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_page', return_value=0)
+
+    result = get_requests({'queryStringParameters': {'limit': '10'}})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_get_request_by_id(mocker, simple_request):
@@ -91,7 +174,7 @@ def test_get_request_by_id(mocker, simple_request):
     result = get_request_by_id(1)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_request)
+    assert json.loads(result['body']) == simple_request
 
 
 def test_get_request_by_id_with_wrong_id(mocker):
@@ -100,7 +183,7 @@ def test_get_request_by_id_with_wrong_id(mocker):
     result = get_request_by_id(1)
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_create_request(mocker, simple_request):
@@ -109,7 +192,7 @@ def test_create_request(mocker, simple_request):
     result = create_request({'body': json.dumps(simple_request)})
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_request)
+    assert json.loads(result['body']) == simple_request
 
 
 def test_create_request_when_error_occur(mocker, simple_request):
@@ -118,7 +201,37 @@ def test_create_request_when_error_occur(mocker, simple_request):
     result = create_request({'body': json.dumps(simple_request)})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_create_requests(mocker, simple_request):
+    created = {'created': [simple_request], 'errors': [{'index': 1, 'message': 'creator must be an integer'}]}
+    add_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.add_new_requests', return_value=created)
+
+    result = create_request({'body': json.dumps([simple_request, {}])})
+
+    assert result['statusCode'] == 201
+    assert json.loads(result['body']) == created
+    add_mock.assert_called_once_with([simple_request, {}])
+
+
+def test_create_requests_without_valid_items(mocker):
+    created = {'created': [], 'errors': [{'index': 0, 'message': 'creator must be an integer'}]}
+    mocker.patch('lambda_requests.orm_services.RequestQuery.add_new_requests', return_value=created)
+
+    result = create_request({'body': json.dumps([{}])})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == created
+
+
+def test_create_requests_when_error_occur(mocker, simple_request):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.add_new_requests', return_value=0)
+
+    result = create_request({'body': json.dumps([simple_request])})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_update_request(mocker, simple_request):
@@ -127,7 +240,7 @@ def test_update_request(mocker, simple_request):
     result = update_request(1, {'body': json.dumps({'status': 'approved'})})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_request)
+    assert json.loads(result['body']) == simple_request
 
 
 def test_update_request_when_error_occur(mocker, simple_request):
@@ -136,7 +249,16 @@ def test_update_request_when_error_occur(mocker, simple_request):
     result = update_request(1, {'body': json.dumps({'status': 'approved'})})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_update_request_with_not_existing_id(mocker, simple_request):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.update_request', return_value=None)
+
+    result = update_request(1, {'body': json.dumps({'status': 'approved'})})
+
+    assert result['statusCode'] == 404
+    assert json.loads(result['body']) == {'message': 'Not found'}
 
 
 def test_delete_request(mocker):
@@ -154,35 +276,138 @@ def test_delete_request_when_error_occur(mocker):
     result = delete_request(1)
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_delete_requests(mocker):
+    delete_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.delete_requests', return_value=[1, 3])
+
+    result = delete_requests({'queryStringParameters': {'ids': '1,2,3'}})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == {'deleted': [1, 3]}
+    delete_mock.assert_called_once_with([1, 2, 3])
+
+
+@pytest.mark.parametrize('query_params', [None, {}, {'ids': ''}, {'ids': 'one,two'}])
+def test_delete_requests_with_wrong_ids(query_params):
+    result = delete_requests({'queryStringParameters': query_params})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_delete_requests_when_error_occur(mocker):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.delete_requests', return_value=0)
+
+    result = delete_requests({'queryStringParameters': {'ids': '1,2'}})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_transition_requests(mocker):
+    transition_result = {'updated': [1, 2], 'skipped': [3]}
+    transition_mock = mocker.patch('lambda_requests.orm_services.RequestQuery.transition_requests',
+                                   return_value=transition_result)
+    body = {'ids': [1, '2', 3], 'status': 'approved', 'expected_status': 'created', 'editor': 'U1'}
+
+    result = transition_requests({'body': json.dumps(body)})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == transition_result
+    transition_mock.assert_called_once_with([1, 2, 3], 'approved', 'created', 'U1')
+
+
+@pytest.mark.parametrize('body', [{'ids': [1], 'status': 'approved', 'expected_status': 'created'},
+                                  {'ids': 1, 'status': 'approved', 'expected_status': 'created', 'editor': 'U1'},
+                                  {'ids': '12', 'status': 'approved', 'expected_status': 'created', 'editor': 'U1'},
+                                  {'ids': ['one'], 'status': 'approved', 'expected_status': 'created', 'editor': 'U1'}])
+def test_transition_requests_with_wrong_data(body):
+    result = transition_requests({'body': json.dumps(body)})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_transition_requests_when_error_occur(mocker):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.transition_requests', return_value=0)
+    body = {'ids': [1], 'status': 'approved', 'expected_status': 'created', 'editor': 'U1'}
+
+    result = transition_requests({'body': json.dumps(body)})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_get_request_history_with_empty_history(mocker):
     mocker.patch('lambda_requests.orm_services.RequestHistoryQuery.get_history', return_value=[])
 
-    result = get_request_history(1)
+    result = get_request_history(1, {'queryStringParameters': None})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([])
+    assert json.loads(result['body']) == []
 
 
 def test_get_request_history_with_not_empty_history(mocker, simple_request_history):
     mocker.patch('lambda_requests.orm_services.RequestHistoryQuery.get_history',
                  return_value=[simple_request_history])
 
-    result = get_request_history(1)
+    result = get_request_history(1, {'queryStringParameters': None})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_request_history])
+    assert json.loads(result['body']) == [simple_request_history]
 
 
 def test_get_request_history_when_error_occur(mocker):
     mocker.patch('lambda_requests.orm_services.RequestHistoryQuery.get_history', return_value=0)
 
-    result = get_request_history(1)
+    result = get_request_history(1, {'queryStringParameters': None})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_get_request_history_with_time_range(mocker, simple_request_history):
+    get_history_mock = mocker.patch('lambda_requests.orm_services.RequestHistoryQuery.get_history',
+                                    return_value=[simple_request_history])
+
+    result = get_request_history(1, {'queryStringParameters': {'since': '2022-09-01', 'until': '2022-09-14'}})
+
+    assert result['statusCode'] == 200
+    get_history_mock.assert_called_once_with(1, since='2022-09-01', until='2022-09-14')
+
+
+def test_get_request_history_with_utc_timestamps(mocker, session):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = get_request_history(1, {'queryStringParameters': {'since': '2020-01-01T00:00:00Z',
+                                                               'until': '2100-01-01T00:00:00.000Z'}})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == []
+
+
+def test_get_request_history_with_pagination(mocker, simple_request_history):
+    page = {'items': [simple_request_history], 'next_cursor': None}
+    get_page_mock = mocker.patch('lambda_requests.orm_services.RequestHistoryQuery.get_history_page',
+                                 return_value=page)
+
+    result = get_request_history(1, {'queryStringParameters': {'limit': '1', 'since': '2022-09-01'}})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == page
+    get_page_mock.assert_called_once_with(1, 1, None, since='2022-09-01')
+
+
+@pytest.mark.parametrize('query_params', [{'limit': 'ten'}, {'limit': '501'}, {'cursor': 'wrong'},
+                                          {'since': 'yesterday'}, {'editor': 'U1'}, {'read_your_writes': '1'},
+                                          {'after': '2022-09-01'}, {'limit': '1', 'read_your_writes': '1'}])
+def test_get_request_history_with_wrong_query_params(query_params):
+    result = get_request_history(1, {'queryStringParameters': query_params})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_add_request_history(mocker, simple_request_history):
@@ -191,7 +416,7 @@ def test_add_request_history(mocker, simple_request_history):
     result = add_request_history(1, {'body': json.dumps(simple_request_history)})
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_request_history)
+    assert json.loads(result['body']) == simple_request_history
 
 
 def test_add_request_history_when_error_occur(mocker, simple_request_history):
@@ -200,24 +425,25 @@ def test_add_request_history_when_error_occur(mocker, simple_request_history):
     result = add_request_history(1, {'body': json.dumps(simple_request_history)})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_lambda_handler_with_wrong_endpoint():
     result = lambda_handler({'resource': '/wrong'}, None)
 
     assert result['statusCode'] == 404
-    assert result['body'] == json.dumps({'message': 'Not found'})
+    assert json.loads(result['body']) == {'message': 'Not found'}
 
 
 @pytest.mark.parametrize('requests_event', (('/requests', 'GET', {}, {}, {}),), indirect=True)
 def test_lambda_handler_get_all_requests(mocker, simple_request, requests_event):
-    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests', return_value=[simple_request])
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json',
+                 return_value=json.dumps([simple_request]))
 
     result = lambda_handler(requests_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_request])
+    assert json.loads(result['body']) == [simple_request]
 
 
 @pytest.mark.parametrize('requests_event', (('/requests', 'POST', {}, {}, {}),), indirect=True)
@@ -228,7 +454,7 @@ def test_lambda_handler_create_requests(mocker, simple_request, requests_event):
     result = lambda_handler(requests_event, None)
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_request)
+    assert json.loads(result['body']) == simple_request
 
 
 @pytest.mark.parametrize('requests_event', (('/requests/{id}', 'GET', {}, {'id': 1}, {}),), indirect=True)
@@ -238,7 +464,7 @@ def test_lambda_handler_get_request_by_id(mocker, simple_request, requests_event
     result = lambda_handler(requests_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_request)
+    assert json.loads(result['body']) == simple_request
 
 
 @pytest.mark.parametrize('requests_event', (('/requests/{id}', 'PATCH', {}, {'id': 1}, {}),), indirect=True)
@@ -249,7 +475,7 @@ def test_lambda_handler_update_request(mocker, simple_request, requests_event):
     result = lambda_handler(requests_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_request)
+    assert json.loads(result['body']) == simple_request
 
 
 @pytest.mark.parametrize('requests_event', (('/requests/{id}', 'DELETE', {}, {'id': 1}, {}),), indirect=True)
@@ -262,6 +488,29 @@ def test_lambda_handler_delete_request(mocker, requests_event):
     assert 'body' not in result
 
 
+@pytest.mark.parametrize('requests_event', (('/requests', 'DELETE', {'ids': '1,2'}, {}, {}),), indirect=True)
+def test_lambda_handler_delete_requests(mocker, requests_event):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.delete_requests', return_value=[1, 2])
+
+    result = lambda_handler(requests_event, None)
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == {'deleted': [1, 2]}
+
+
+@pytest.mark.parametrize('requests_event', (('/requests/transitions', 'POST', {}, {}, {}),), indirect=True)
+def test_lambda_handler_transition_requests(mocker, requests_event):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.transition_requests',
+                 return_value={'updated': [1], 'skipped': []})
+    requests_event['body'] = json.dumps({'ids': [1], 'status': 'approved', 'expected_status': 'created',
+                                         'editor': 'U1'})
+
+    result = lambda_handler(requests_event, None)
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == {'updated': [1], 'skipped': []}
+
+
 @pytest.mark.parametrize('requests_event', (('/requests/{id}/history', 'GET', {}, {'id': 1}, {}),), indirect=True)
 def test_lambda_handler_get_request_history(mocker, simple_request_history, requests_event):
     mocker.patch('lambda_requests.orm_services.RequestHistoryQuery.get_history', return_value=[simple_request_history])
@@ -269,7 +518,7 @@ def test_lambda_handler_get_request_history(mocker, simple_request_history, requ
     result = lambda_handler(requests_event, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_request_history])
+    assert json.loads(result['body']) == [simple_request_history]
 
 
 @pytest.mark.parametrize('requests_event', (('/requests/{id}/history', 'POST', {}, {'id': 1}, {}),), indirect=True)
@@ -280,4 +529,45 @@ def test_lambda_handler_add_request_history(mocker, simple_request_history, requ
     result = lambda_handler(requests_event, None)
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_request_history)
+    assert json.loads(result['body']) == simple_request_history
+
+
+def test_get_requests_not_modified(mocker, requests_version):
+    get_requests_json = mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json',
+                                     return_value=json.dumps([]))
+    query_params = {'status': 'created'}
+    etag = build_etag([1, 1, 1], query_params)
+
+    result_1 = get_requests({'queryStringParameters': query_params, 'headers': {}})
+    result_2 = get_requests({'queryStringParameters': query_params, 'headers': {'If-None-Match': etag}})
+    requests_version.return_value = [2, 1, 1]
+    result_3 = get_requests({'queryStringParameters': query_params, 'headers': {'If-None-Match': etag}})
+
+    assert result_1['headers']['ETag'] == etag
+    assert result_2 == {'statusCode': 304, 'headers': {'ETag': etag}}
+    assert result_3['statusCode'] == 200
+    assert result_3['headers']['ETag'] != etag
+    assert get_requests_json.call_count == 2
+
+
+def test_get_requests_without_version(mocker, requests_version):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_requests_json', return_value=json.dumps([]))
+    requests_version.return_value = 0
+
+    result = get_requests({'queryStringParameters': None, 'headers': {'If-None-Match': '*'}})
+
+    assert result['statusCode'] == 200
+    assert 'ETag' not in result['headers']
+
+
+@pytest.mark.parametrize('requests_event', (('/requests/{id}', 'GET', None, {'id': 1}, None),), indirect=True)
+def test_lambda_handler_get_request_by_id_not_modified(mocker, simple_request, requests_event):
+    mocker.patch('lambda_requests.orm_services.RequestQuery.get_request_by_id', return_value=simple_request)
+
+    result_1 = lambda_handler(requests_event, None)
+    requests_event['headers'] = {'If-None-Match': result_1['headers']['ETag']}
+    result_2 = lambda_handler(requests_event, None)
+
+    assert result_1['statusCode'] == 200
+    assert result_2['statusCode'] == 304
+    assert 'body' not in result_2
@@ -1,7 +1,11 @@
+import json
 import pytest
+from datetime import date
+from sqlalchemy.exc import SQLAlchemyError
 
 from lambda_requests.orm_services import RequestQuery, RequestHistoryQuery
 from models.models import Request, RequestHistory
+from utils.http import encode_json
 
 from .test_bonuses_orm_services import fill_bonuses_db
 from .test_workers_orm_services import fill_workers_db
@@ -210,6 +214,79 @@ def test_get_requests_with_payment_date_gt_query(mocker, session, fill_bonuses_d
     assert len(result_3) == 0
 
 
+def test_get_requests_with_request_ids_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result_1 = RequestQuery.get_requests(request_ids=[3, 1, 10])
+    result_2 = RequestQuery.get_requests(request_ids=[10])
+
+    assert [request['id'] for request in result_1] == [1, 3]
+    assert result_2 == []
+
+
+def test_get_requests_with_fields_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.get_requests(fields=['id', 'status', 'payment_date', 'reviewer_name'])
+
+    assert len(result) == len(test_requests_data)
+    assert result[0] == {'id': 1, 'status': 'created', 'payment_date': date(2022, 9, 14),
+                         'reviewer_name': 'Roman Romanov'}
+
+
+@pytest.mark.parametrize('fields,joins', [(['id', 'status'], 0), (['id', 'bonus_name'], 1),
+                                          (['id', 'creator_name', 'creator_slack_id'], 1),
+                                          (['id', 'creator_name', 'reviewer_slack_id'], 2), (None, 3)])
+def test_get_requests_query_skips_unneeded_joins(session, fields, joins):
+    query = RequestQuery._build_requests_query(session, fields=fields)
+
+    assert str(query.statement).count(' JOIN ') == joins
+
+
+def test_get_requests_with_fields_query_keeps_rows_of_full_query(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                                 fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    session.query(Request).filter(Request.id == 2).update({'reviewer': None})
+    session.commit()
+
+    full_result = RequestQuery.get_requests()
+    projected_result = RequestQuery.get_requests(fields=['id', 'status'])
+
+    assert [request['id'] for request in projected_result] == [request['id'] for request in full_result]
+
+
+def test_get_requests_json_query_matches_orm_path(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                 fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    orm_result = json.loads(encode_json(RequestQuery.get_requests(status='created')))
+    json_result = json.loads(RequestQuery.get_requests_json(status='created'))
+
+    # Both are ISO 8601, but Postgres drops trailing zeros of the fractional seconds
+    for request in orm_result + json_result:
+        request.pop('created_at')
+    assert json_result == orm_result
+
+
+def test_get_requests_json_query_with_fields(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result_1 = RequestQuery.get_requests_json(fields=['id', 'bonus_name'], request_ids=[2])
+    result_2 = RequestQuery.get_requests_json(status='approved')
+
+    assert json.loads(result_1) == [{'id': 2, 'bonus_name': 'Newcomer'}]
+    assert result_2 == '[]'
+
+
+def test_get_requests_json_query_when_error_occur(mocker, session):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    mocker.patch('lambda_requests.orm_services.json_array', side_effect=SQLAlchemyError())
+
+    result = RequestQuery.get_requests_json()
+
+    assert result == 0
+
+
 def test_get_requests_with_payment_date_lt_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
     mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
 
@@ -248,6 +325,38 @@ def test_get_requests_with_wrong_params_query(mocker, session, fill_bonuses_db,
     assert result == 0
 
 
+def test_get_requests_page_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    page_1 = RequestQuery.get_requests_page(2)
+    page_2 = RequestQuery.get_requests_page(2, page_1['next_cursor'])
+
+    assert [item['id'] for item in page_1['items']] == [1, 2]
+    assert page_1['next_cursor'] is not None
+    assert [item['id'] for item in page_2['items']] == [3]
+    assert page_2['next_cursor'] is None
+
+
+def test_get_requests_page_query_with_filters(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    page_1 = RequestQuery.get_requests_page(1, reviewer_id=1)
+    page_2 = RequestQuery.get_requests_page(1, page_1['next_cursor'], reviewer_id=1)
+
+    assert [item['id'] for item in page_1['items']] == [1]
+    assert [item['id'] for item in page_2['items']] == [3]
+    assert page_2['next_cursor'] is None
+
+
+def test_get_requests_page_query_with_wrong_params(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                   fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.get_requests_page(2, reviewer_id='two')
+
+    assert result == 0
+
+
 def test_add_new_request_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
     mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
     new_request_data = {
@@ -267,7 +376,7 @@ def test_add_new_request_query(mocker, session, fill_bonuses_db, fill_workers_db
 
     assert type(result) is dict
     assert id == len(test_requests_data) + 1
-    assert result == new_request_data
+    assert result == {**new_request_data, 'payment_date': date(2022, 9, 10)}
 
 
 def test_add_new_request_query_with_wrong_data(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
@@ -287,6 +396,59 @@ def test_add_new_request_query_with_wrong_data(mocker, session, fill_bonuses_db,
     assert result == 0
 
 
+def test_add_new_requests_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    new_requests_data = [
+        {'creator': 2, 'reviewer': 1, 'bonus_type': 2, 'payment_amount': 200, 'payment_date': '2022-09-10',
+         'description': 'Newcomer bonus'},
+        {'creator': 3, 'reviewer': 1, 'bonus_type': 1, 'payment_amount': 300, 'payment_date': '2022-09-11',
+         'status': 'approved'}
+    ]
+
+    result = RequestQuery.add_new_requests(new_requests_data)
+
+    assert result['errors'] == []
+    assert [item['id'] for item in result['created']] == [4, 5]
+    assert result['created'][0]['payment_date'] == date(2022, 9, 10)
+    assert result['created'][0]['description'] == 'Newcomer bonus'
+    assert result['created'][1]['status'] == 'created'
+    assert result['created'][1]['description'] == ''
+    assert len(RequestQuery.get_requests()) == len(test_requests_data) + 2
+
+
+def test_add_new_requests_query_with_wrong_items(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                 fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    valid_request = {'creator': 2, 'reviewer': 1, 'bonus_type': 2, 'payment_amount': 200,
+                     'payment_date': '2022-09-10'}
+    new_requests_data = [
+        'request',
+        {**valid_request, 'priority': 'high'},
+        {**valid_request, 'creator': '2'},
+        {**valid_request, 'payment_date': '10.09.2022'},
+        {**valid_request, 'description': 'x' * 101},
+        {**valid_request, 'reviewer': 10},
+        {**valid_request, 'bonus_type': 10},
+        valid_request
+    ]
+
+    result = RequestQuery.add_new_requests(new_requests_data)
+
+    assert [item['id'] for item in result['created']] == [4]
+    assert [error['index'] for error in result['errors']] == [0, 1, 2, 3, 4, 5, 6]
+    assert result['errors'][1]['message'] == 'Unknown fields: priority'
+    assert result['errors'][5]['message'] == 'creator and reviewer must be existing workers'
+
+
+@pytest.mark.parametrize('size', [0, RequestQuery.MAX_BULK_SIZE + 1])
+def test_add_new_requests_query_with_wrong_size(mocker, session, size):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.add_new_requests([{}] * size)
+
+    assert result == 0
+
+
 def test_update_request_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
     mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
     new_request_data = {
@@ -302,6 +464,15 @@ def test_update_request_query(mocker, session, fill_bonuses_db, fill_workers_db,
     assert result['status'] == 'approved'
 
 
+def test_update_request_query_with_creator(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.update_request(1, {'creator': 3})
+
+    assert result['creator'] == 3
+    assert [entry['changes'] for entry in RequestHistoryQuery.get_history(1)] == ['creator: 2 -> 3']
+
+
 def test_update_request_query_with_wrong_data(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
     mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
     new_request_data = {
@@ -314,6 +485,65 @@ def test_update_request_query_with_wrong_data(mocker, session, fill_bonuses_db,
     assert result == 0
 
 
+def test_update_request_query_with_not_existing_request(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                        fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.update_request(10, {'status': 'approved'})
+
+    assert result is None
+
+
+@pytest.mark.parametrize('new_request_data', [{}, {'id': 10}, {'created_at': '2022-09-14'}])
+def test_update_request_query_with_not_updatable_columns(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                         fill_requests_db, new_request_data):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.update_request(1, new_request_data)
+
+    assert result == 0
+
+
+def test_update_request_query_sets_updated_at(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    RequestQuery.update_request(1, {'payment_amount': 150})
+
+    updated_at = session.query(Request.updated_at).filter(Request.id == 1).scalar()
+
+    assert updated_at is not None
+
+
+def test_update_request_query_records_history(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    RequestQuery.update_request(1, {'status': 'approved', 'payment_amount': 100, 'bonus_type': 3, 'editor': 'U1'})
+
+    history = RequestHistoryQuery.get_history(1)
+
+    assert sorted(entry['changes'] for entry in history) == ['bonus_type: 1 -> 3', 'status: created -> approved']
+    assert {entry['editor'] for entry in history} == {'U1'}
+
+
+def test_update_request_query_without_changes_records_no_history(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                                 fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.update_request(1, {'status': 'created'})
+
+    assert result['status'] == 'created'
+    assert RequestHistoryQuery.get_history(1) == []
+
+
+def test_update_request_query_with_wrong_data_records_no_history(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                                 fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    RequestQuery.update_request(1, {'bonus_type': 33, 'status': 'approved'})
+
+    assert session.query(RequestHistory).count() == 0
+
+
 def test_delete_request_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
     mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
 
@@ -347,6 +577,64 @@ def test_delete_request_query_when_request_deleted(mocker, session, fill_bonuses
     assert result == 0
 
 
+def test_delete_requests_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result_1 = RequestQuery.delete_requests([1, 2, 10])
+    result_2 = RequestQuery.delete_requests([1, 2, 3])
+
+    assert sorted(result_1) == [1, 2]
+    assert result_2 == [3]
+    assert RequestQuery.get_requests() == []
+
+
+def test_delete_requests_query_with_wrong_ids(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.delete_requests(['one', 2])
+
+    assert result == 0
+
+
+def test_transition_requests_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    RequestQuery.update_request(2, {'status': 'rejected'})
+
+    result = RequestQuery.transition_requests([1, 2, 3, 10], 'approved', 'created', 'U1')
+
+    history = RequestHistoryQuery.get_history(1)
+    approved = RequestQuery.get_requests(status='approved')
+
+    assert result == {'updated': [1, 3], 'skipped': [2, 10]}
+    assert [request['id'] for request in approved] == [1, 3]
+    assert len(history) == 1
+    assert history[0]['changes'] == 'status: created -> approved'
+    assert history[0]['editor'] == 'U1'
+    assert [entry['changes'] for entry in RequestHistoryQuery.get_history(2)] == ['status: created -> rejected']
+
+
+def test_transition_requests_query_twice(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result_1 = RequestQuery.transition_requests([1], 'approved', 'created', 'U1')
+    result_2 = RequestQuery.transition_requests([1], 'approved', 'created', 'U1')
+
+    assert result_1 == {'updated': [1], 'skipped': []}
+    assert result_2 == {'updated': [], 'skipped': [1]}
+    assert len(RequestHistoryQuery.get_history(1)) == 1
+
+
+@pytest.mark.parametrize('request_ids,editor', [([], 'U1'), (list(range(RequestQuery.MAX_TRANSITION_SIZE + 1)), 'U1'),
+                                                 ([1], 'U' * 51)])
+def test_transition_requests_query_with_wrong_data(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                   fill_requests_db, request_ids, editor):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    result = RequestQuery.transition_requests(request_ids, 'approved', 'created', editor)
+
+    assert result == 0
+
+
 def test_get_request_history_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db,
                                    fill_requests_history_db):
     mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
@@ -369,6 +657,61 @@ def test_get_request_history_query_with_wrong_id(mocker, session, fill_bonuses_d
     assert len(result) == 0
 
 
+def fill_history(session, request_id, timestamps):
+    for timestamp in timestamps:
+        entry = RequestHistory(request_id, f'at {timestamp}', 'U1')
+        entry.timestamp = timestamp
+        session.add(entry)
+        session.commit()
+
+
+def test_get_request_history_query_is_ordered_by_timestamp(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                          fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    fill_history(session, 1, ['2022-09-03', '2022-09-01', '2022-09-02'])
+
+    result = RequestHistoryQuery.get_history(1)
+
+    assert [entry['changes'] for entry in result] == ['at 2022-09-01', 'at 2022-09-02', 'at 2022-09-03']
+
+
+def test_get_request_history_query_with_time_range(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                   fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    fill_history(session, 1, ['2022-09-01', '2022-09-02', '2022-09-03'])
+
+    result = RequestHistoryQuery.get_history(1, since='2022-09-02', until='2022-09-03')
+
+    assert [entry['changes'] for entry in result] == ['at 2022-09-02']
+
+
+def test_get_request_history_page_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    # Two entries share a timestamp, the id keeps the page boundary between them stable
+    fill_history(session, 1, ['2022-09-01', '2022-09-02', '2022-09-02', '2022-09-03', '2022-09-04'])
+
+    changes, cursor = [], None
+    while True:
+        page = RequestHistoryQuery.get_history_page(1, 2, cursor, since='2022-09-02')
+        changes.extend(entry['changes'] for entry in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert changes == ['at 2022-09-02', 'at 2022-09-02', 'at 2022-09-03', 'at 2022-09-04']
+
+
+def test_get_request_history_page_query_when_error_occur(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                         fill_requests_db):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    mocker.patch('lambda_requests.orm_services.RequestHistoryQuery._build_history_query',
+                 side_effect=SQLAlchemyError('error'))
+
+    result = RequestHistoryQuery.get_history_page(1, 10)
+
+    assert result == 0
+
+
 def test_add_request_history_query(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db,
                                    fill_requests_history_db):
     mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
@@ -398,3 +741,44 @@ def test_add_request_history_query_with_wrong_data(mocker, session, fill_bonuses
     result = RequestHistoryQuery.add_history(new_request_history)
 
     assert result == 0
+
+
+@pytest.mark.parametrize('write', [
+    lambda: RequestQuery.add_new_request({'creator': 2, 'reviewer': 1, 'bonus_type': 2, 'payment_amount': 200,
+                                          'payment_date': '2022-09-10'}),
+    lambda: RequestQuery.add_new_requests([{'creator': 2, 'reviewer': 1, 'bonus_type': 2, 'payment_amount': 200,
+                                            'payment_date': '2022-09-10'}]),
+    lambda: RequestQuery.update_request(1, {'description': 'Updated'}),
+    lambda: RequestQuery.delete_request(1),
+    lambda: RequestQuery.transition_requests([1, 2], 'approved', 'created', 'U1')
+])
+def test_request_writes_bump_requests_version(mocker, session, fill_bonuses_db, fill_workers_db, fill_requests_db,
+                                              write):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    write()
+
+    assert RequestQuery.get_requests_version() == [1, 0, 0]
+
+
+@pytest.mark.parametrize('write', [
+    lambda: RequestQuery.update_request(10, {'description': 'Updated'}),
+    lambda: RequestQuery.delete_request(10),
+    lambda: RequestQuery.transition_requests([1, 2], 'approved', 'rejected', 'U1')
+])
+def test_request_writes_without_changes_keep_requests_version(mocker, session, fill_bonuses_db, fill_workers_db,
+                                                              fill_requests_db, write):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+
+    write()
+
+    assert RequestQuery.get_requests_version() == [0, 0, 0]
+
+
+def test_get_requests_version_query_when_error_occur(mocker, session):
+    mocker.patch('lambda_requests.orm_services.open_db_session', return_value=session)
+    mocker.patch('lambda_requests.orm_services.get_versions', side_effect=SQLAlchemyError())
+
+    result = RequestQuery.get_requests_version()
+
+    assert result == 0
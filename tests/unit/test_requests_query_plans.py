@@ -0,0 +1,80 @@
+import json
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from lambda_requests.orm_services import RequestQuery, RequestHistoryQuery
+
+INDEX_NODE_TYPES = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+def explain(session, query):
+    statement = query.statement.compile(dialect=postgresql.dialect())
+
+    # Empty test tables make a sequential scan the cheapest plan, so it is ruled out to see which
+    # index the planner picks once the table is big enough
+    session.execute('SET LOCAL enable_seqscan = off')
+    plan = session.connection().exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', statement.params).scalar()
+    session.rollback()
+
+    return plan[0]['Plan'] if isinstance(plan, list) else json.loads(plan)[0]['Plan']
+
+
+def plan_nodes(plan):
+    yield plan
+
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def requests_scans(plan):
+    return [node for node in plan_nodes(plan)
+            if node.get('Relation Name') == 'requests' or node.get('Index Name', '').startswith('ix_requests')]
+
+
+@pytest.mark.parametrize('filters,expected_indexes', [
+    ({}, ('ix_requests_active_id',)),
+    ({'after_id': 100, 'limit': 101}, ('ix_requests_active_id',)),
+    ({'status': 'approved'}, ('ix_requests_status_id',)),
+    ({'creator_id': 1}, ('ix_requests_creator_id',)),
+    ({'reviewer_id': 2}, ('ix_requests_reviewer_id',)),
+    ({'payment_date': '2022-09-14'}, ('ix_requests_payment_date',)),
+    ({'payment_date_gt': '2022-09-01', 'payment_date_lt': '2022-09-14'}, ('ix_requests_payment_date',)),
+    ({'request_id': 1}, ('requests_pkey', 'ix_requests_active_id')),
+])
+def test_get_requests_query_uses_index(session, filters, expected_indexes):
+    query = RequestQuery._build_requests_query(session, **filters)
+
+    plan = explain(session, query)
+    scans = requests_scans(plan)
+
+    assert all(node['Node Type'] != 'Seq Scan' for node in scans)
+    assert any(node['Node Type'] in INDEX_NODE_TYPES and node['Index Name'] in expected_indexes
+               for node in scans)
+
+
+@pytest.mark.parametrize('table,column,expected_index', [
+    ('requests_history', 'request_id', 'ix_requests_history_request_timestamp'),
+    ('workers_roles_relations', 'worker_id', 'ix_workers_roles_relations_worker_role'),
+    ('workers_roles_relations', 'role_id', 'ix_workers_roles_relations_role_id'),
+])
+def test_join_columns_use_index(session, table, column, expected_index):
+    session.execute('SET LOCAL enable_seqscan = off')
+    plan = session.execute(f'EXPLAIN (FORMAT JSON) SELECT * FROM {table} WHERE {column} = 1').scalar()
+    session.rollback()
+
+    index_names = [node.get('Index Name') for node in plan_nodes(plan[0]['Plan'])]
+
+    assert expected_index in index_names
+
+
+@pytest.mark.parametrize('filters', [{}, {'since': '2022-09-01', 'until': '2022-09-14'},
+                                     {'after': ('2022-09-01 10:00:00+00:00', 10), 'limit': 101}])
+def test_get_history_query_uses_index_order(session, filters):
+    query = RequestHistoryQuery._build_history_query(session, 1, **filters)
+
+    plan = explain(session, query)
+    nodes = list(plan_nodes(plan))
+
+    # Rows are read in index order, so no separate Sort node is needed
+    assert all(node['Node Type'] != 'Sort' for node in nodes)
+    assert any(node.get('Index Name') == 'ix_requests_history_request_timestamp' for node in nodes)
@@ -0,0 +1,15 @@
+from models.models import CatalogVersion
+from utils.versions import get_versions, bump_version
+
+
+def test_get_versions_without_bumps(session):
+    assert get_versions(session, ['requests', 'workers']) == [0, 0]
+
+
+def test_bump_version(session):
+    bump_version(session, 'requests')
+    bump_version(session, 'requests')
+    bump_version(session, 'workers')
+
+    assert get_versions(session, ['workers', 'bonuses_types', 'requests']) == [1, 0, 2]
+    assert session.query(CatalogVersion).count() == 2
@@ -1,6 +1,14 @@
+import base64
+import gzip
 import pytest
 
 from lambda_workers.lambda_function import *
+from models.models import Worker, Role, WorkersRolesRelation
+
+
+@pytest.fixture(autouse=True)
+def workers_version(mocker):
+    return mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_version', return_value=[1])
 
 
 @pytest.fixture
@@ -32,30 +40,91 @@ def workers_event_with_path_params(request):
 
 
 def test_get_workers_with_empty_workers_list(mocker):
-    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers', return_value=[])
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json', return_value=json.dumps([]))
 
     result = get_workers({'queryStringParameters': {}})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([])
+    assert json.loads(result['body']) == []
 
 
 def test_get_workers_with_not_empty_bonuses_list(mocker, simple_worker):
-    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers', return_value=[simple_worker])
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json', return_value=json.dumps([simple_worker]))
+
+    result = get_workers({'queryStringParameters': {}})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == [simple_worker]
+
+
+def test_get_workers_body_is_compact(mocker, session):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    session.add_all([Role('worker'), Worker('Oleg Olegov', 'RF4E000Q1CC', 'developer')])
+    session.flush()
+    session.add(WorkersRolesRelation(1, 1))
+    session.flush()
 
     result = get_workers({'queryStringParameters': {}})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_worker])
+    assert result['body'] == '[{"id":1,"full_name":"Oleg Olegov","position":"developer","slack_id":"RF4E000Q1CC",' \
+                             '"roles":["worker"]}]'
 
 
 def test_get_workers_when_error_occur(mocker):
-    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers', return_value=0)
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json', return_value=0)
 
     result = get_workers({'queryStringParameters': {}})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+@pytest.mark.parametrize('query_params,expected', [
+    ({'ids': '1,2'}, {'worker_ids': [1, 2], 'slack_ids': None, 'fields': None}),
+    ({'slack_ids': 'RF4E000Q1CC,V11ED730DDR'},
+     {'worker_ids': None, 'slack_ids': ['RF4E000Q1CC', 'V11ED730DDR'], 'fields': None})
+])
+def test_get_workers_by_ids(mocker, simple_worker, query_params, expected):
+    get_workers_mock = mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json',
+                                    return_value=json.dumps([simple_worker]))
+
+    result = get_workers({'queryStringParameters': query_params})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == [simple_worker]
+    get_workers_mock.assert_called_once_with(**expected)
+
+
+@pytest.mark.parametrize('query_params,get_workers_result', [({'ids': '1,two'}, '[]'), ({'slack_ids': ''}, '[]'),
+                                                             ({'ids': '1'}, 0)])
+def test_get_workers_by_ids_when_error_occur(mocker, query_params, get_workers_result):
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json', return_value=get_workers_result)
+
+    result = get_workers({'queryStringParameters': query_params})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+@pytest.mark.parametrize('query_params,expected', [({'fields': 'slack_id'}, {'fields': ['id', 'slack_id']}),
+                                                   ({'fields': 'roles', 'role': 'reviewer'},
+                                                    {'role': 'reviewer', 'fields': ['id', 'roles']})])
+def test_get_workers_with_fields(mocker, simple_worker, query_params, expected):
+    get_workers_mock = mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json',
+                                    return_value=json.dumps([simple_worker]))
+
+    result = get_workers({'queryStringParameters': query_params})
+
+    assert result['statusCode'] == 200
+    get_workers_mock.assert_called_once_with(**expected)
+
+
+def test_get_workers_with_wrong_fields():
+    result = get_workers({'queryStringParameters': {'fields': 'email'}})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_get_worker_by_id_when_worker_exists(mocker, simple_worker):
@@ -64,7 +133,7 @@ def test_get_worker_by_id_when_worker_exists(mocker, simple_worker):
     result = get_worker_by_id(1)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_worker)
+    assert json.loads(result['body']) == simple_worker
 
 
 def test_get_worker_by_id_when_worker_not_exists(mocker, simple_worker):
@@ -73,7 +142,7 @@ def test_get_worker_by_id_when_worker_not_exists(mocker, simple_worker):
     result = get_worker_by_id(1)
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_get_worker_by_slack_id_with_correct_slack_id(mocker, simple_worker):
@@ -82,7 +151,7 @@ def test_get_worker_by_slack_id_with_correct_slack_id(mocker, simple_worker):
     result = get_workers({'queryStringParameters': {'slack_id': 'RF4E000Q1CC'}})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_worker)
+    assert json.loads(result['body']) == simple_worker
 
 
 def test_get_worker_by_slack_id_with_not_correct_slack_id(mocker, simple_worker):
@@ -91,16 +160,16 @@ def test_get_worker_by_slack_id_with_not_correct_slack_id(mocker, simple_worker)
     result = get_workers({'queryStringParameters': {'slack_id': 'RF4E000Q1C1'}})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_get_worker_by_role(mocker, simple_worker):
-    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers', return_value=[simple_worker])
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json', return_value=json.dumps([simple_worker]))
 
     result = get_workers({'queryStringParameters': {'role': 'worker'}})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_worker])
+    assert json.loads(result['body']) == [simple_worker]
 
 
 def test_create_bonus(mocker, simple_worker):
@@ -109,7 +178,7 @@ def test_create_bonus(mocker, simple_worker):
     result = create_worker({'body': json.dumps(simple_worker)})
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_worker)
+    assert json.loads(result['body']) == simple_worker
 
 
 def test_create_bonus_when_error_occur(mocker, simple_worker):
@@ -118,7 +187,7 @@ def test_create_bonus_when_error_occur(mocker, simple_worker):
     result = create_worker({'body': json.dumps(simple_worker)})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_delete_worker(mocker):
@@ -136,7 +205,7 @@ def test_delete_worker_when_error_occur(mocker):
     result = delete_worker(1)
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_update_worker(mocker, simple_worker):
@@ -145,7 +214,7 @@ def test_update_worker(mocker, simple_worker):
     result = update_worker(1, {'body': json.dumps({'full_name': 'Oleg'})})
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_worker)
+    assert json.loads(result['body']) == simple_worker
 
 
 def test_update_worker_when_error_occur(mocker):
@@ -154,24 +223,54 @@ def test_update_worker_when_error_occur(mocker):
     result = update_worker(1, {'body': json.dumps({'full_name': 'Oleg'})})
 
     assert result['statusCode'] == 400
-    assert result['body'] == json.dumps({'message': 'Bad Request'})
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
+
+
+def test_update_worker_with_not_existing_id(mocker):
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.update_worker', return_value=None)
+
+    result = update_worker(1, {'body': json.dumps({'full_name': 'Oleg'})})
+
+    assert result['statusCode'] == 404
+    assert json.loads(result['body']) == {'message': 'Not found'}
+
+
+def test_sync_workers(mocker, simple_worker):
+    sync_result = {'created': 1, 'updated': 0, 'unchanged': 0, 'errors': []}
+    sync_mock = mocker.patch('lambda_workers.orm_services.WorkersQuery.sync_workers', return_value=sync_result)
+
+    result = sync_workers({'body': json.dumps([simple_worker])})
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == sync_result
+    sync_mock.assert_called_once_with([simple_worker])
+
+
+@pytest.mark.parametrize('body,sync_result', [({'full_name': 'Oleg'}, None), ([{'full_name': 'Oleg'}], 0)])
+def test_sync_workers_when_error_occur(mocker, body, sync_result):
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.sync_workers', return_value=sync_result)
+
+    result = sync_workers({'body': json.dumps(body)})
+
+    assert result['statusCode'] == 400
+    assert json.loads(result['body']) == {'message': 'Bad Request'}
 
 
 def test_lambda_handler_with_wrong_endpoint():
     result = lambda_handler({'resource': '/wrong'}, None)
 
     assert result['statusCode'] == 404
-    assert result['body'] == json.dumps({'message': 'Not found'})
+    assert json.loads(result['body']) == {'message': 'Not found'}
 
 
 @pytest.mark.parametrize('workers_event_without_path_params', (('GET', {}),), indirect=True)
 def test_lambda_handler_get_all_workers(mocker, simple_worker, workers_event_without_path_params):
-    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers', return_value=[simple_worker])
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json', return_value=json.dumps([simple_worker]))
 
     result = lambda_handler(workers_event_without_path_params, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps([simple_worker])
+    assert json.loads(result['body']) == [simple_worker]
 
 
 @pytest.mark.parametrize('workers_event_without_path_params', (('POST', {}),), indirect=True)
@@ -182,7 +281,7 @@ def test_lambda_handler_create_worker(mocker, simple_worker, workers_event_witho
     result = lambda_handler(workers_event_without_path_params, None)
 
     assert result['statusCode'] == 201
-    assert result['body'] == json.dumps(simple_worker)
+    assert json.loads(result['body']) == simple_worker
 
 
 @pytest.mark.parametrize('workers_event_with_path_params', (('GET', {}, {'id': 1}),), indirect=True)
@@ -192,7 +291,7 @@ def test_lambda_handler_get_worker_by_id(mocker, simple_worker, workers_event_wi
     result = lambda_handler(workers_event_with_path_params, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_worker)
+    assert json.loads(result['body']) == simple_worker
 
 
 @pytest.mark.parametrize('workers_event_with_path_params', (('PATCH', {}, {'id': 1}),), indirect=True)
@@ -203,7 +302,7 @@ def test_lambda_handler_update_worker(mocker, simple_worker, workers_event_with_
     result = lambda_handler(workers_event_with_path_params, None)
 
     assert result['statusCode'] == 200
-    assert result['body'] == json.dumps(simple_worker)
+    assert json.loads(result['body']) == simple_worker
 
 
 @pytest.mark.parametrize('workers_event_with_path_params', (('DELETE', {}, {'id': 1}),), indirect=True)
@@ -213,4 +312,53 @@ def test_lambda_handler_delete_bonus(mocker, workers_event_with_path_params):
     result = lambda_handler(workers_event_with_path_params, None)
 
     assert result['statusCode'] == 204
-    assert 'body' not in result
\ No newline at end of file
+    assert 'body' not in result
+
+
+def test_lambda_handler_sync_workers(mocker, simple_worker):
+    sync_result = {'created': 0, 'updated': 1, 'unchanged': 0, 'errors': []}
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.sync_workers', return_value=sync_result)
+    event = {'resource': '/workers/sync', 'httpMethod': 'POST', 'body': json.dumps([simple_worker])}
+
+    result = lambda_handler(event, None)
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body']) == sync_result
+
+
+def test_lambda_handler_compresses_workers_list(mocker, simple_worker):
+    workers = [{**simple_worker, 'id': n} for n in range(1, 101)]
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json', return_value=json.dumps(workers))
+    event = {'resource': '/workers', 'httpMethod': 'GET', 'queryStringParameters': None,
+             'headers': {'Accept-Encoding': 'gzip'}}
+
+    result = lambda_handler(event, None)
+
+    assert result['statusCode'] == 200
+    assert result['isBase64Encoded'] is True
+    assert result['headers']['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(base64.b64decode(result['body']))) == workers
+
+
+@pytest.mark.parametrize('query_params', [None, {'role': 'reviewer'}, {'ids': '1,2'}])
+def test_get_workers_not_modified(mocker, query_params):
+    get_workers_json = mocker.patch('lambda_workers.orm_services.WorkersQuery.get_workers_json',
+                                    return_value=json.dumps([]))
+    etag = build_etag([1], query_params)
+
+    result_1 = get_workers({'queryStringParameters': query_params, 'headers': {}})
+    result_2 = get_workers({'queryStringParameters': query_params, 'headers': {'If-None-Match': etag}})
+
+    assert result_1['headers']['ETag'] == etag
+    assert result_2 == {'statusCode': 304, 'headers': {'ETag': etag}}
+    assert get_workers_json.call_count == 1
+
+
+def test_get_worker_by_slack_id_has_no_version_etag(mocker, simple_worker, workers_version):
+    mocker.patch('lambda_workers.orm_services.WorkersQuery.get_worker_by_slack_id', return_value=simple_worker)
+
+    result = get_workers({'queryStringParameters': {'slack_id': 'RF4E000Q1CC'}, 'headers': {'If-None-Match': '*'}})
+
+    assert result['statusCode'] == 200
+    assert 'ETag' not in result['headers']
+    assert workers_version.call_count == 0
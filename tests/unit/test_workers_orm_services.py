@@ -1,7 +1,9 @@
+import json
 import pytest
 from copy import deepcopy
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from lambda_workers.orm_services import WorkersQuery
+from lambda_workers.orm_services import WorkersQuery, WORKERS_CACHE
 from models.models import Worker, Role, WorkersRolesRelation
 
 test_role_data = [
@@ -54,6 +56,89 @@ def test_get_workers_query_with_not_empty_db(mocker, session, fill_workers_db):
     assert len(result) == len(test_workers_data)
 
 
+def test_get_workers_query_aggregates_roles(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.get_workers()
+
+    assert [worker['id'] for worker in result] == [1, 2, 3]
+    assert [worker['roles'] for worker in result] == [['worker', 'reviewer', 'administrator'],
+                                                      ['worker', 'reviewer'], ['worker']]
+    assert result[0] == {'id': 1, 'full_name': 'Roman Romanov', 'position': 'developer', 'slack_id': 'EF4ED73Q12X',
+                         'roles': ['worker', 'reviewer', 'administrator']}
+
+
+def test_get_workers_query_with_ids(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result_1 = WorkersQuery.get_workers(worker_ids=[3, 1, 10])
+    result_2 = WorkersQuery.get_workers(slack_ids=['V11ED730DDR', 'NOT_EXISTING'])
+
+    assert [worker['id'] for worker in result_1] == [1, 3]
+    assert [worker['id'] for worker in result_2] == [2]
+
+
+@pytest.mark.parametrize('filters,expected_ids', [
+    ({}, [1, 2, 3]), ({'role': 'reviewer'}, [1, 2]), ({'worker_ids': [3, 1]}, [1, 3]),
+    ({'slack_ids': ['V11ED730DDR']}, [2]), ({'worker_id': 2}, [2]), ({'slack_id': 'RF4E000Q1CC'}, [3])
+])
+def test_get_workers_query_with_fields_without_roles(mocker, session, fill_workers_db, filters, expected_ids):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.get_workers(fields=['id', 'slack_id'], **filters)
+
+    assert [worker['id'] for worker in result] == expected_ids
+    assert set(result[0]) == {'id', 'slack_id'}
+
+
+def test_get_workers_query_with_fields_skips_workers_without_roles(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    session.query(WorkersRolesRelation).filter(WorkersRolesRelation.worker_id == 3).delete()
+    session.commit()
+
+    result = WorkersQuery.get_workers(fields=['id', 'full_name'])
+
+    assert [worker['id'] for worker in result] == [1, 2]
+
+
+def test_get_workers_query_with_fields_with_roles(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.get_workers(fields=['id', 'roles'])
+
+    assert result[1] == {'id': 2, 'roles': ['worker', 'reviewer']}
+
+
+@pytest.mark.parametrize('filters', [{}, {'role': 'reviewer'}, {'slack_ids': ['V11ED730DDR']},
+                                     {'fields': ['id', 'full_name']},
+                                     {'fields': ['id', 'roles'], 'worker_ids': [1, 3]}])
+def test_get_workers_json_query_matches_orm_path(mocker, session, fill_workers_db, filters):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    orm_result = WorkersQuery.get_workers(**filters)
+    json_result = WorkersQuery.get_workers_json(**filters)
+
+    assert json.loads(json_result) == orm_result
+
+
+def test_get_workers_json_query_when_error_occur(mocker, session):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    mocker.patch('lambda_workers.orm_services.json_array', side_effect=SQLAlchemyError())
+
+    result = WorkersQuery.get_workers_json()
+
+    assert result == 0
+
+
+@pytest.mark.parametrize('read_your_writes', [True, False])
+def test_get_workers_query_routing(mocker, session, read_your_writes):
+    open_session_mock = mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    WorkersQuery.get_workers(read_your_writes=read_your_writes)
+
+    open_session_mock.assert_called_once_with(read_only=not read_your_writes)
+
+
 def test_get_worker_by_id_query_with_empty_db(mocker, session):
     mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
 
@@ -122,6 +207,63 @@ def test_get_worker_by_role_query_with_not_empty_db(mocker, session, fill_worker
     assert result[0]['full_name'] == test_workers_data[0]['full_name']
 
 
+def test_get_worker_by_slack_id_query_is_cached(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    get_workers_spy = mocker.spy(WorkersQuery, 'get_workers')
+
+    result_1 = WorkersQuery.get_worker_by_slack_id('EF4ED73Q12X')
+    result_2 = WorkersQuery.get_worker_by_slack_id('EF4ED73Q12X')
+    result_3 = WorkersQuery.get_worker_by_id(1)
+
+    assert result_1 == result_2 == result_3
+    assert get_workers_spy.call_count == 1
+    assert WORKERS_CACHE.stats['hits'] == 2
+    assert WORKERS_CACHE.stats['misses'] == 1
+
+
+def test_get_worker_by_id_query_fills_cache_from_primary(mocker, session, fill_workers_db):
+    open_session_mock = mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    WorkersQuery.update_worker(1, {'position': 'manager'})
+    result = WorkersQuery.get_worker_by_id(1)
+
+    assert result['position'] == 'manager'
+    assert open_session_mock.call_args_list[-1] == mocker.call(read_only=False)
+
+
+def test_get_worker_by_id_query_with_read_your_writes_skips_cache(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    get_workers_spy = mocker.spy(WorkersQuery, 'get_workers')
+
+    WorkersQuery.get_worker_by_id(1)
+    WorkersQuery.get_worker_by_id(1, read_your_writes=True)
+
+    assert get_workers_spy.call_count == 2
+
+
+def test_get_worker_by_id_query_with_not_existing_worker_is_not_cached(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.get_worker_by_id(10)
+
+    assert result == 0
+    assert len(WORKERS_CACHE) == 0
+
+
+@pytest.mark.parametrize('write', [
+    lambda: WorkersQuery.update_worker(1, {'slack_id': 'VB4E7G5Q1RR'}),
+    lambda: WorkersQuery.delete_worker(3),
+    lambda: WorkersQuery.add_new_worker({'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR'})
+])
+def test_worker_writes_invalidate_cache(mocker, session, fill_workers_db, write):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    WorkersQuery.get_worker_by_slack_id('EF4ED73Q12X')
+
+    write()
+
+    assert len(WORKERS_CACHE) == 0
+
+
 def test_delete_worker_query_with_empty_db(mocker, session):
     mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
 
@@ -215,9 +357,29 @@ def test_update_worker_query_with_wrong_id(mocker, session, fill_workers_db):
 
     result = WorkersQuery.update_worker(4, new_data)
 
+    assert result is None
+
+
+def test_update_worker_query_with_not_updatable_column(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    new_data = {'id': 10, 'full_name': 'Stepan Stepanov'}
+
+    result = WorkersQuery.update_worker(3, new_data)
+
     assert result == 0
 
 
+def test_update_worker_query_without_data(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result_1 = WorkersQuery.update_worker(1, {})
+    result_2 = WorkersQuery.update_worker(4, {})
+
+    assert result_1['id'] == 1
+    assert result_1['full_name'] == test_workers_data[0]['full_name']
+    assert result_2 is None
+
+
 def test_update_worker_query_with_wrong_slack_id(mocker, session, fill_workers_db):
     mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
     new_data = {'full_name': 'Stepan Stepanov', 'slack_id': 'V11ED730DDR', 'roles': [2]}
@@ -236,6 +398,29 @@ def test_update_worker_query_with_wrong_slack_id(mocker, session, fill_workers_d
     assert result == 0
 
 
+@pytest.mark.parametrize('roles', [[], 3, '1', [1, 'reviewer'], [1.0]])
+def test_update_worker_query_with_wrong_roles(mocker, session, fill_workers_db, roles):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    new_data = {'roles': roles}
+
+    result = WorkersQuery.update_worker(3, new_data)
+
+    assert result == 0
+    assert WorkersQuery.get_worker_by_id(3)['roles'] == ['worker']
+    assert WorkersQuery.get_workers_version() == [0]
+
+
+def test_update_worker_query_uses_one_session(mocker, session, fill_workers_db):
+    open_session_mock = mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    new_data = {'full_name': 'Stepan Stepanov', 'roles': [1, 3]}
+
+    result = WorkersQuery.update_worker(2, new_data)
+
+    open_session_mock.assert_called_once_with()
+    assert result['full_name'] == 'Stepan Stepanov'
+    assert result['roles'] == ['worker', 'administrator']
+
+
 def test_update_worker_query_with_adding_new_role(mocker, session, fill_workers_db):
     mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
     new_data = {'roles': [1, 2]}
@@ -256,3 +441,202 @@ def test_update_worker_query_with_deleting_role(mocker, session, fill_workers_db
     assert type(result) == dict
     assert result['id'] == 1
     assert result['roles'] == ['worker']
+
+
+@pytest.mark.parametrize('worker_id,roles,expected_roles', [(1, [3, 1], ['worker', 'administrator']),
+                                                            (3, [1, 2, 3], ['worker', 'reviewer', 'administrator'])])
+def test_update_worker_query_syncs_roles_in_two_statements(mocker, session, fill_workers_db, worker_id, roles,
+                                                           expected_roles):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    execute_spy = mocker.spy(session, 'execute')
+
+    result = WorkersQuery.update_worker(worker_id, {'roles': roles})
+
+    # SELECT id, DELETE, INSERT, the re-read and the version bump
+    assert execute_spy.call_count == 5
+    assert result['roles'] == expected_roles
+
+
+def test_update_worker_query_with_duplicated_roles(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.update_worker(3, {'roles': [2, 2, 1]})
+
+    assert result['roles'] == ['worker', 'reviewer']
+    assert session.query(WorkersRolesRelation).filter(WorkersRolesRelation.worker_id == 3).count() == 2
+
+
+def test_add_new_worker_query_with_duplicated_roles(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.add_new_worker({'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR', 'roles': [2, 2]})
+
+    assert session.query(WorkersRolesRelation).filter(WorkersRolesRelation.worker_id == result['id']).count() == 1
+
+
+def test_workers_roles_relations_are_unique(session, fill_workers_db):
+    session.add(WorkersRolesRelation(1, 1))
+
+    with pytest.raises(IntegrityError):
+        session.flush()
+
+
+def test_sync_workers_query(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    directory = [
+        {'full_name': 'Roman Romanov', 'position': 'developer', 'slack_id': 'EF4ED73Q12X', 'roles': [3, 1]},
+        {'full_name': 'Petro Petrov', 'position': 'team lead', 'slack_id': 'V11ED730DDR'},
+        {'full_name': 'Oleg Olegov', 'position': 'developer', 'slack_id': 'RF4E000Q1CC'},
+        {'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR'},
+        {'full_name': 'Ivan Ivanov', 'slack_id': 'AB4E7G5Q1RR', 'roles': [2, 2]}
+    ]
+
+    result = WorkersQuery.sync_workers(directory)
+    workers = {worker['slack_id']: worker for worker in WorkersQuery.get_workers()}
+
+    assert result == {'created': 2, 'updated': 1, 'unchanged': 2, 'errors': []}
+    assert workers['EF4ED73Q12X']['roles'] == ['worker', 'administrator']
+    assert workers['V11ED730DDR']['position'] == 'team lead'
+    assert workers['V11ED730DDR']['roles'] == ['worker', 'reviewer']
+    assert workers['VB4E7G5Q1RR']['roles'] == ['worker']
+    assert workers['AB4E7G5Q1RR']['roles'] == ['reviewer']
+
+
+def test_sync_workers_query_without_position_keeps_it(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    directory = [
+        {'full_name': 'Petro Petrov', 'slack_id': 'V11ED730DDR'},
+        {'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR'}
+    ]
+
+    result = WorkersQuery.sync_workers(directory)
+    workers = {worker['slack_id']: worker for worker in WorkersQuery.get_workers()}
+
+    assert result == {'created': 1, 'updated': 0, 'unchanged': 1, 'errors': []}
+    assert workers['V11ED730DDR']['position'] == 'developer'
+    assert workers['VB4E7G5Q1RR']['position'] == ''
+
+
+def test_sync_workers_query_twice(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    directory = [{'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR', 'roles': [1, 2]}]
+
+    WorkersQuery.sync_workers(deepcopy(directory))
+    result = WorkersQuery.sync_workers(deepcopy(directory))
+
+    assert result == {'created': 0, 'updated': 0, 'unchanged': 1, 'errors': []}
+    assert session.query(WorkersRolesRelation).count() == 8
+
+
+def test_sync_workers_query_with_invalid_entries(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    directory = [
+        {'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR'},
+        'Stepan Stepanov',
+        {'full_name': 'Ivan Ivanov', 'slack_id': 'VB4E7G5Q1RR'},
+        {'full_name': 'Ivan Ivanov', 'slack_id': 'AB4E7G5Q1RR', 'email': 'ivan@example.com'},
+        {'full_name': 'Ivan Ivanov', 'slack_id': 'AB4E7G5Q1RR000'},
+        {'full_name': '', 'slack_id': 'AB4E7G5Q1RR'},
+        {'full_name': 'Ivan Ivanov', 'slack_id': 'AB4E7G5Q1RR', 'roles': ['reviewer']}
+    ]
+
+    result = WorkersQuery.sync_workers(directory)
+
+    assert result['created'] == 1
+    assert [error['index'] for error in result['errors']] == [1, 2, 3, 4, 5, 6]
+
+
+def test_sync_workers_query_without_valid_entries(mocker, session, fill_workers_db):
+    open_session_mock = mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.sync_workers([{'slack_id': 'VB4E7G5Q1RR'}])
+
+    assert result['created'] == 0
+    assert len(result['errors']) == 1
+    open_session_mock.assert_not_called()
+
+
+def test_sync_workers_query_with_unknown_references(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    directory = [
+        {'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR', 'roles': [10]},
+        {'full_name': 'Roman Romanov', 'slack_id': 'AB4E7G5Q1RR'},
+        {'full_name': 'Ivan Ivanov', 'slack_id': 'CB4E7G5Q1RR', 'roles': [2]},
+        {'full_name': 'Ivan Ivanov', 'slack_id': 'DB4E7G5Q1RR'},
+        {'full_name': 'Oleg Olegov', 'slack_id': 'EB4E7G5Q1RR', 'roles': []}
+    ]
+
+    result = WorkersQuery.sync_workers(directory)
+
+    assert result['created'] == 1
+    assert [error['index'] for error in result['errors']] == [0, 1, 3, 4]
+    assert session.query(Worker).count() == len(test_workers_data) + 1
+
+
+def test_sync_workers_query_when_error_occur(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    mocker.patch.object(session, 'execute', side_effect=SQLAlchemyError())
+
+    result = WorkersQuery.sync_workers([{'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR'}])
+
+    assert result == 0
+
+
+def test_sync_workers_query_with_empty_directory(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    result = WorkersQuery.sync_workers([])
+
+    assert result == 0
+    assert session.query(Worker).count() == len(test_workers_data)
+
+
+@pytest.mark.parametrize('write', [
+    lambda: WorkersQuery.add_new_worker({'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR'}),
+    lambda: WorkersQuery.update_worker(1, {'position': 'manager'}),
+    lambda: WorkersQuery.delete_worker(1),
+    lambda: WorkersQuery.sync_workers([{'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR'}])
+])
+def test_worker_writes_bump_workers_version(mocker, session, fill_workers_db, write):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    write()
+
+    assert WorkersQuery.get_workers_version() == [1]
+
+
+def test_delete_worker_query_without_worker_keeps_workers_version(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    WorkersQuery.delete_worker(10)
+
+    assert WorkersQuery.get_workers_version() == [0]
+
+
+@pytest.mark.parametrize('data', [{}, {'roles': [1]}])
+def test_update_worker_query_without_changes_keeps_workers_version(mocker, session, fill_workers_db, data):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+
+    WorkersQuery.update_worker(3, data)
+
+    assert WorkersQuery.get_workers_version() == [0]
+
+
+def test_sync_workers_query_twice_keeps_workers_version(mocker, session, fill_workers_db):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    directory = [{'full_name': 'Stepan Stepanov', 'slack_id': 'VB4E7G5Q1RR', 'roles': [1, 2]},
+                 {'full_name': 'Petro Petrov', 'position': 'developer', 'slack_id': 'V11ED730DDR'}]
+
+    WorkersQuery.sync_workers(deepcopy(directory))
+    WorkersQuery.sync_workers(deepcopy(directory))
+
+    assert WorkersQuery.get_workers_version() == [1]
+
+
+def test_get_workers_version_query_when_error_occur(mocker, session):
+    mocker.patch('lambda_workers.orm_services.open_db_session', return_value=session)
+    mocker.patch('lambda_workers.orm_services.get_versions', side_effect=SQLAlchemyError())
+
+    result = WorkersQuery.get_workers_version()
+
+    assert result == 0
@@ -0,0 +1,101 @@
+import time
+from collections import OrderedDict
+
+# Every cache created in this container, by name, so their counters can be reported together
+CACHES = {}
+
+
+class TTLCache:
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+
+        CACHES[name] = self
+
+    def get(self, key):
+        entry = self._entries.get(key)
+
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+
+            self.stats['misses'] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+
+        return entry[0]
+
+    def set(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def reset_stats(self):
+        self.stats.update(hits=0, misses=0, evictions=0)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class VersionedCache:
+    # Holds one value tagged with a version; within the freshness window it is returned without any
+    # check, after it only the (cheap) version is loaded and the value is reloaded when that changed
+    def __init__(self, name, freshness):
+        self.name = name
+        self.freshness = freshness
+        self.stats = {'hits': 0, 'misses': 0, 'version_checks': 0}
+        self.version = None
+        self._value = None
+        self._checked_at = None
+
+        CACHES[name] = self
+
+    def get(self, load_version, load_value):
+        now = time.monotonic()
+
+        if self._checked_at is not None and now - self._checked_at < self.freshness:
+            self.stats['hits'] += 1
+            return self._value
+
+        # The version is read before the value, so a concurrent write can only make the value newer than
+        # its tag, which costs one extra reload, never a stale value kept under a current version
+        version = load_version()
+        self.stats['version_checks'] += 1
+
+        if self._checked_at is not None and version == self.version:
+            self.stats['hits'] += 1
+            self._checked_at = now
+            return self._value
+
+        self.stats['misses'] += 1
+        self._value = load_value()
+        self.version = version
+        self._checked_at = now
+
+        return self._value
+
+    def clear(self):
+        self.version = None
+        self._value = None
+        self._checked_at = None
+
+    def reset_stats(self):
+        self.stats.update(hits=0, misses=0, version_checks=0)
+
+    def __len__(self):
+        return 0 if self._checked_at is None else 1
+
+
+def get_cache_stats():
+    return {name: dict(cache.stats, size=len(cache)) for name, cache in CACHES.items()}
@@ -1,14 +1,131 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.exc import OperationalError
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from sqlalchemy import create_engine, event, bindparam, any_, select, func, literal, cast, Integer, Text
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
 from sqlalchemy.orm.session import Session
-from sqlalchemy_utils import database_exists, create_database
+from sqlalchemy.sql.functions import Function
+from sqlalchemy.pool import QueuePool, NullPool
 
+from utils.instrumentation import is_instrumentation_enabled, record_query
 
-def build_db_url():
+# Engines live for the whole life of the container, so warm invocations reuse pooled connections
+_engines = {}
+
+# Session scope of the current invocation, shared by every *Query method called inside it
+_session_scope = ContextVar('session_scope', default=None)
+
+POOL_STATS = {
+    'connects': 0,
+    'checkouts': 0,
+    'checkins': 0,
+    'overflow': 0,
+    'wait_time': 0.0
+}
+
+
+class StatsQueuePool(QueuePool):
+    def _do_get(self):
+        started_at = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        finally:
+            POOL_STATS['wait_time'] += time.perf_counter() - started_at
+
+
+# statement_timeout is in milliseconds, pool_size=None means no pooling on our side (NullPool)
+POOL_PROFILES = {
+    'lambda': {
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': 10,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'statement_timeout': 10000
+    },
+    'proxy': {
+        'pool_size': None,
+        'max_overflow': None,
+        'pool_timeout': None,
+        'pool_recycle': None,
+        'pool_pre_ping': False,
+        'statement_timeout': 10000
+    },
+    'server': {
+        'pool_size': 20,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'statement_timeout': 30000
+    }
+}
+
+DEFAULT_POOL_PROFILE = 'lambda'
+
+
+def get_pool_profile():
+    profile_name = os.environ.get('DB_POOL_PROFILE') or DEFAULT_POOL_PROFILE
+
+    if profile_name not in POOL_PROFILES:
+        raise ValueError(f'Unknown database pool profile: {profile_name}')
+
+    return POOL_PROFILES[profile_name]
+
+
+def build_engine_options(profile):
+    options = {
+        'pool_pre_ping': profile['pool_pre_ping'],
+        'connect_args': {'options': f'-c statement_timeout={profile["statement_timeout"]}'}
+    }
+
+    if profile['pool_size'] is None:
+        options['poolclass'] = NullPool
+    else:
+        options['poolclass'] = StatsQueuePool
+        options['pool_size'] = profile['pool_size']
+        options['max_overflow'] = profile['max_overflow']
+        options['pool_timeout'] = profile['pool_timeout']
+        options['pool_recycle'] = profile['pool_recycle']
+
+    return options
+
+
+def _collect_pool_stats(engine):
+    pool = engine.pool
+
+    @event.listens_for(pool, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        POOL_STATS['connects'] += 1
+
+    @event.listens_for(pool, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_STATS['checkouts'] += 1
+        if isinstance(pool, QueuePool):
+            POOL_STATS['overflow'] = max(POOL_STATS['overflow'], pool.overflow())
+
+    @event.listens_for(pool, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        POOL_STATS['checkins'] += 1
+
+
+def _collect_query_stats(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        record_query(statement, time.perf_counter() - connection.info['query_started_at'].pop())
+
+
+def build_db_url(host=None):
     pg_user = os.environ.get('POSTGRES_USER')
     pg_password = os.environ.get('POSTGRES_PASSWORD')
-    pg_host = os.environ.get('POSTGRES_HOST')
+    pg_host = host or os.environ.get('POSTGRES_HOST')
     pg_port = os.environ.get('POSTGRES_PORT')
     pg_db = os.environ.get('POSTGRES_DB')
 
@@ -17,25 +134,121 @@ def build_db_url():
     return url
 
 
-def create_db_engine():
-    db_url = build_db_url()
-    engine = create_engine(db_url)
+def build_replica_db_url():
+    replica_host = os.environ.get('POSTGRES_REPLICA_HOST')
 
-    try:
-        if not database_exists(engine.url):
-            create_database(engine.url)
-        else:
-            engine.connect()
-    except OperationalError:
-        print(f'Connection failed: {db_url}')
+    if not replica_host:
         return None
 
+    return build_db_url(host=replica_host)
+
+
+def create_db_engine(db_url=None):
+    db_url = db_url or build_db_url()
+    engine = create_engine(db_url, **build_engine_options(get_pool_profile()))
+    _collect_pool_stats(engine)
+
+    # Listeners are attached only when enabled, so a disabled build pays nothing per statement
+    if is_instrumentation_enabled():
+        _collect_query_stats(engine)
+
     return engine
 
 
-def open_db_session():
-    engine = create_db_engine()
+def get_db_engine(read_only=False):
+    db_url = build_replica_db_url() if read_only else None
+    db_url = db_url or build_db_url()
+
+    if db_url not in _engines:
+        _engines[db_url] = create_db_engine(db_url)
+
+    return _engines[db_url]
+
+
+def dispose_db_engines():
+    for engine in _engines.values():
+        engine.dispose()
+
+    _engines.clear()
+
+
+def get_pool_stats():
+    stats = dict(POOL_STATS)
+    stats['engines'] = len(_engines)
+    stats['checked_out'] = sum(engine.pool.checkedout() for engine in _engines.values()
+                               if isinstance(engine.pool, QueuePool))
+
+    return stats
+
+
+def any_of(column, values, item_type=Integer):
+    # column = ANY(:values) sends the whole list as one array parameter, so the statement is the same for any length
+    return column == any_(array_param(values, item_type))
+
+
+def array_param(values, item_type=Integer):
+    return bindparam(None, value=list(values), type_=ARRAY(item_type))
+
+
+def json_array(subquery, order_by):
+    # Postgres builds the whole JSON array as text, so the driver hands it over without parsing it. row_to_json
+    # keeps the column order and, unlike json_build_object and json_agg, adds no spaces, so the body is as
+    # compact as encode_json output. Function skips the func registry, where SQLAlchemy-Utils puts a row_to_json
+    # that opts out of the statement cache
+    row = cast(Function('row_to_json', subquery.table_valued()), Text)
+    array = func.concat('[', func.string_agg(row, aggregate_order_by(literal(','), order_by)), ']')
+
+    return select(array)
+
+
+class SessionScope:
+    def __init__(self, read_only=False):
+        self.read_only = read_only
+        self.session = None
+
+    def get_session(self):
+        if self.session is None:
+            self.session = Session(get_db_engine(read_only=self.read_only))
+
+        return self.session
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
+@contextmanager
+def db_session_scope(read_only=False):
+    scope = SessionScope(read_only=read_only)
+    token = _session_scope.set(scope)
+
+    try:
+        yield scope
+    finally:
+        _session_scope.reset(token)
+        scope.close()
+
+
+def with_db_session_scope(handler):
+    @wraps(handler)
+    def wrapper(event, context):
+        with db_session_scope(read_only=event.get('httpMethod') == 'GET'):
+            return handler(event, context)
+
+    return wrapper
+
+
+def open_db_session(read_only=False):
+    scope = _session_scope.get()
+
+    # Inside a scope the shared session is handed out without closing it on exit, unless a write
+    # is requested from a read-only (possibly replica) scope
+    if scope is not None and (read_only or not scope.read_only):
+        return nullcontext(scope.get_session())
+
+    # Read-only sessions go to the replica when POSTGRES_REPLICA_HOST is set, everything else to the primary
+    engine = get_db_engine(read_only=read_only)
     session = Session(engine)
 
     return session
-
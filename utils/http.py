@@ -1,36 +1,172 @@
+import base64
+import gzip
+import hashlib
 import json
+import os
+import time
+from copy import deepcopy
+from datetime import date
+from functools import wraps
 
-HTTP_BAD_REQUEST = {
-    'statusCode': 400,
-    'headers': {
-        'Content-Type': 'application/json'
-    },
-    'body': json.dumps({'message': 'Bad Request'})
-}
-
-HTTP_NOT_FOUND = {
-    'statusCode': 404,
-    'headers': {
-        'Content-Type': 'application/json'
-    },
-    'body': json.dumps({'message': 'Not found'})
-}
-
-HTTP_NO_CONTENT = {
-    'statusCode': 204,
-    'headers': {
-        'Content-Type': 'application/json'
+from utils.instrumentation import is_instrumentation_enabled, record_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _encode_default(value):
+    # date covers datetime as well, both go out as ISO 8601 like the bodies built by Postgres
+    if isinstance(value, date):
+        return value.isoformat()
+
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _encode_stdlib(data):
+    # Same compact output as orjson, so responses do not depend on which encoder is installed
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_encode_default)
+
+
+def _encode_orjson(data):
+    return orjson.dumps(data, default=_encode_default).decode()
+
+
+JSON_ENCODERS = {'stdlib': _encode_stdlib}
+
+if orjson is not None:
+    JSON_ENCODERS['orjson'] = _encode_orjson
+
+
+def get_json_encoder():
+    # orjson when it is installed, JSON_ENCODER=stdlib forces the fallback
+    encoder_name = os.environ.get('JSON_ENCODER') or ('orjson' if 'orjson' in JSON_ENCODERS else 'stdlib')
+
+    if encoder_name not in JSON_ENCODERS:
+        raise ValueError(f'Unknown JSON encoder: {encoder_name}')
+
+    return JSON_ENCODERS[encoder_name]
+
+
+encode_json = get_json_encoder()
+
+
+class FrozenDict(dict):
+    # Static responses are shared by every invocation of a warm container, so nobody may change them in place
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f'{type(self).__name__} is immutable')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _immutable
+
+    # Copies are plain dicts all the way down, whichever way they are made, so callers can change them
+    def copy(self):
+        return {key: value.copy() if isinstance(value, FrozenDict) else value for key, value in self.items()}
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return {deepcopy(key, memo): deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
+def static_response(status_code, data=None):
+    response = {
+        'statusCode': status_code,
+        'headers': FrozenDict({
+            'Content-Type': 'application/json'
+        })
     }
-}
 
+    if data is not None:
+        response['body'] = encode_json(data)
 
-def http_ok(data):
-    return {
+    return FrozenDict(response)
+
+
+HTTP_BAD_REQUEST = static_response(400, {'message': 'Bad Request'})
+
+HTTP_NOT_FOUND = static_response(404, {'message': 'Not found'})
+
+HTTP_NO_CONTENT = static_response(204)
+
+
+MAX_IDS = 100
+
+
+def parse_id_list(value, max_ids=MAX_IDS, item_type=int):
+    ids = [item_type(item.strip()) for item in value.split(',') if item.strip()]
+
+    if not 0 < len(ids) <= max_ids:
+        raise ValueError(f'Between 1 and {max_ids} ids are allowed')
+
+    return ids
+
+
+def parse_fields(value, allowed_fields):
+    fields = list(dict.fromkeys(item.strip() for item in value.split(',') if item.strip()))
+
+    if not fields or not set(fields).issubset(allowed_fields):
+        raise ValueError(f'Fields must be some of: {", ".join(allowed_fields)}')
+
+    # id is always returned, clients and pagination cursors rely on it
+    return ['id'] + [field for field in fields if field != 'id']
+
+
+def dump_body(data):
+    if not is_instrumentation_enabled():
+        return encode_json(data)
+
+    started_at = time.perf_counter()
+    body = encode_json(data)
+    record_serialization(time.perf_counter() - started_at)
+
+    return body
+
+
+def http_ok(data, etag=None):
+    return http_ok_encoded(dump_body(data), etag)
+
+
+def http_ok_encoded(body, etag=None):
+    # For bodies that are already JSON text, e.g. built by the database
+    response = {
         'statusCode': 200,
         'headers': {
             'Content-Type': 'application/json'
         },
-        'body': json.dumps(data)
+        'body': body
+    }
+
+    if etag is not None:
+        response['headers']['ETag'] = etag
+
+    return response
+
+
+def http_not_modified(etag):
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag
+        }
+    }
+
+
+def http_bad_request(data):
+    return {
+        'statusCode': 400,
+        'headers': {
+            'Content-Type': 'application/json'
+        },
+        'body': dump_body(data)
     }
 
 
@@ -40,5 +176,148 @@ def http_created(data):
         'headers': {
             'Content-Type': 'application/json'
         },
-        'body': json.dumps(data)
+        'body': dump_body(data)
     }
+
+
+# Bodies shorter than this many bytes are not worth the CPU and the base64 overhead
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE') or 1024)
+
+
+def _compress_gzip(body):
+    # mtime=0 keeps the output stable for the same body
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _compress_brotli(body):
+    return brotli.compress(body, quality=5)
+
+
+# In order of preference
+COMPRESSORS = {'gzip': _compress_gzip}
+
+if brotli is not None:
+    COMPRESSORS = {'br': _compress_brotli, **COMPRESSORS}
+
+
+def get_header(event, name):
+    # API Gateway passes headers as the client sent them, names are case-insensitive
+    name = name.lower()
+
+    for header, value in (event.get('headers') or {}).items():
+        if header.lower() == name:
+            return value
+
+    return None
+
+
+def choose_encoding(accept_encoding):
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        weight = 1.0
+
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    weight = float(param[2:])
+                except ValueError:
+                    weight = 0.0
+
+        weights[coding.lower()] = weight
+
+    for encoding in COMPRESSORS:
+        if weights.get(encoding, weights.get('*', 0.0)) > 0:
+            return encoding
+
+    return None
+
+
+def compress_response(response, accept_encoding, min_size=None):
+    body = response.get('body')
+    min_size = COMPRESSION_MIN_SIZE if min_size is None else min_size
+
+    if body is None or response.get('isBase64Encoded'):
+        return response
+
+    raw_body = body.encode()
+    if len(raw_body) < min_size:
+        return response
+
+    headers = {**response.get('headers', {}), 'Vary': 'Accept-Encoding'}
+    encoding = choose_encoding(accept_encoding)
+
+    if encoding is None:
+        return {**response, 'headers': headers}
+
+    headers['Content-Encoding'] = encoding
+
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(COMPRESSORS[encoding](raw_body)).decode(),
+        'isBase64Encoded': True
+    }
+
+
+def with_compression(handler):
+    @wraps(handler)
+    def wrapper(event, context):
+        # With binary media types enabled API Gateway hands request bodies over base64-encoded as well
+        if event.get('isBase64Encoded') and event.get('body') is not None:
+            event = {**event, 'body': base64.b64decode(event['body']).decode(), 'isBase64Encoded': False}
+
+        response = handler(event, context)
+
+        return compress_response(response, get_header(event, 'Accept-Encoding'))
+
+    return wrapper
+
+
+def _etag(data):
+    # Weak, since the same representation may be sent gzip- or brotli-encoded
+    return f'W/"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+
+
+def build_etag(version, query_params=None):
+    # A validator from data versions also covers the query string, which picks what is read at that version
+    return _etag(encode_json([version, sorted((query_params or {}).items())]).encode())
+
+
+def content_etag(body):
+    return _etag(body.encode())
+
+
+def etag_matches(event, etag):
+    if_none_match = get_header(event, 'If-None-Match')
+
+    if etag is None or not if_none_match:
+        return False
+
+    tags = {tag.strip() for tag in if_none_match.split(',')}
+    # If-None-Match uses the weak comparison, W/ does not matter
+    tags |= {tag[2:] for tag in tags if tag.startswith('W/')}
+
+    return '*' in tags or etag[2:] in tags
+
+
+def with_conditional_get(handler):
+    @wraps(handler)
+    def wrapper(event, context):
+        response = handler(event, context)
+
+        if event.get('httpMethod') != 'GET' or response.get('statusCode') != 200 or response.get('body') is None:
+            return response
+
+        # Handlers that can tell from data versions set the ETag themselves, any other body is hashed
+        etag = response['headers'].get('ETag') or content_etag(response['body'])
+
+        if etag_matches(event, etag):
+            return http_not_modified(etag)
+
+        return {**response, 'headers': {**response['headers'], 'ETag': etag}}
+
+    return wrapper
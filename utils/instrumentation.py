@@ -0,0 +1,83 @@
+import json
+import os
+import time
+from functools import wraps
+
+from utils.cache import get_cache_stats
+
+INVOCATION_STATS = {
+    'queries': 0,
+    'db_time': 0.0,
+    'slowest_time': 0.0,
+    'slowest_statement': None,
+    'serialization_time': 0.0
+}
+
+_cold_start = True
+
+
+def is_instrumentation_enabled():
+    return os.environ.get('DB_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+
+
+def reset_invocation_stats():
+    INVOCATION_STATS.update(queries=0, db_time=0.0, slowest_time=0.0, slowest_statement=None,
+                            serialization_time=0.0)
+
+
+def record_query(statement, elapsed):
+    INVOCATION_STATS['queries'] += 1
+    INVOCATION_STATS['db_time'] += elapsed
+
+    if elapsed > INVOCATION_STATS['slowest_time']:
+        INVOCATION_STATS['slowest_time'] = elapsed
+        INVOCATION_STATS['slowest_statement'] = statement
+
+
+def record_serialization(elapsed):
+    INVOCATION_STATS['serialization_time'] += elapsed
+
+
+def build_invocation_log(event, response, duration, cold_start):
+    # utils.database imports this module for its query listeners, so the import is deferred to break the cycle
+    from utils.database import get_pool_stats
+
+    slowest_statement = INVOCATION_STATS['slowest_statement']
+
+    return {
+        'route': event.get('resource'),
+        'method': event.get('httpMethod'),
+        'status_code': response.get('statusCode') if isinstance(response, dict) else None,
+        'cold_start': cold_start,
+        'duration_ms': round(duration * 1000, 3),
+        'queries': INVOCATION_STATS['queries'],
+        'db_time_ms': round(INVOCATION_STATS['db_time'] * 1000, 3),
+        'slowest_statement_ms': round(INVOCATION_STATS['slowest_time'] * 1000, 3),
+        'slowest_statement': slowest_statement[:200] if slowest_statement else None,
+        'serialization_ms': round(INVOCATION_STATS['serialization_time'] * 1000, 3),
+        'caches': get_cache_stats(),
+        'pool': get_pool_stats()
+    }
+
+
+def log_invocation(handler):
+    @wraps(handler)
+    def wrapper(event, context):
+        global _cold_start
+
+        cold_start, _cold_start = _cold_start, False
+
+        if not is_instrumentation_enabled():
+            return handler(event, context)
+
+        reset_invocation_stats()
+        started_at = time.perf_counter()
+
+        response = handler(event, context)
+
+        invocation_log = build_invocation_log(event, response, time.perf_counter() - started_at, cold_start)
+        print(json.dumps(invocation_log))
+
+        return response
+
+    return wrapper
@@ -0,0 +1,36 @@
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode()
+
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+    if not isinstance(position, dict):
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+    return position
+
+
+def parse_limit(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+
+    limit = int(limit)
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'Limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    return limit
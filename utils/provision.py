@@ -0,0 +1,37 @@
+import os
+import sys
+from alembic import command
+from alembic.config import Config
+from sqlalchemy.exc import OperationalError
+from sqlalchemy_utils import database_exists, create_database
+
+from utils.database import build_db_url
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+
+
+def build_alembic_config(db_url):
+    config = Config(os.path.join(MODELS_DIR, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(MODELS_DIR, 'alembic'))
+    config.set_main_option('sqlalchemy.url', db_url.replace('%', '%%'))
+
+    return config
+
+
+def provision_database(revision='head'):
+    db_url = build_db_url()
+
+    try:
+        if not database_exists(db_url):
+            create_database(db_url)
+
+        command.upgrade(build_alembic_config(db_url), revision)
+    except OperationalError:
+        print(f'Connection failed: {db_url}')
+        return False
+
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if provision_database(*sys.argv[1:]) else 1)
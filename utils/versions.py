@@ -0,0 +1,20 @@
+from sqlalchemy import select, String
+from sqlalchemy.dialects.postgresql import insert
+
+from models.models import CatalogVersion
+from utils.database import any_of
+
+
+def get_versions(session, names):
+    # One lookup for all names; a name that was never bumped is at version 0
+    statement = select(CatalogVersion.name, CatalogVersion.version).where(any_of(CatalogVersion.name, names, String))
+    versions = dict(session.execute(statement).all())
+
+    return [versions.get(name, 0) for name in names]
+
+
+def bump_version(session, name):
+    # Runs inside the writing transaction, so readers never see the new rows under the old version
+    statement = insert(CatalogVersion).values(name=name, version=1) \
+        .on_conflict_do_update(index_elements=[CatalogVersion.name], set_={'version': CatalogVersion.version + 1})
+    session.execute(statement)